@@ -0,0 +1,118 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# python -m benchmarks run --backends numpy,numba --scenes random_spheres,swarm --bodies 10,100,1000 --particles 0,10000 --output results.json
+# python -m benchmarks compare baseline.json results.json --tolerance 0.2 (exits with 1 when anything got slower)
+# python -m benchmarks precision 1 --integrators euler,leapfrog,yoshida4 --steps 86400,21600,3600 --duration 7776000 --target 1e-6
+#--------------------------------#
+
+import sys
+import json
+import time
+import argparse
+
+from engine.backends import BACKENDS, machine_fingerprint
+from engine.integrators import INTEGRATORS
+from run_headless import find_scene
+from .scenes import SCENES
+from . import scaling, precision
+
+def _names(text):
+    return [name for name in text.split(',') if name]
+
+def _counts(text):
+    return [int(n) for n in text.split(',') if n]
+
+def _steps(text):
+    return [float(t) for t in text.split(',') if t]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Scaling benchmarks of the physics backends.')
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help='time a sweep of scene sizes and save the results')
+    run.add_argument('--scenes', type=_names, default=list(SCENES), help='comma separated: %s' % ', '.join(SCENES))
+    run.add_argument('--backends', type=_names, default=list(BACKENDS), help='comma separated: %s' % ', '.join(BACKENDS))
+    run.add_argument('--integrator', default=None, help='integrator name (see engine/integrators.py), defaults to euler')
+    run.add_argument('--bodies', type=_counts, default=[10, 100, 1000], help='comma separated body counts')
+    run.add_argument('--particles', type=_counts, default=[0, 1000, 10000, 100000], help='comma separated particle counts')
+    run.add_argument('--repeat', type=int, default=5, help='timed calls of each timer (the best is compared)')
+    run.add_argument('--max-seconds', type=float, default=2., help='stop growing a scene on a backend once an update takes this long')
+    run.add_argument('--output', default='benchmark.json', help='where to write the results')
+
+    compare = commands.add_parser('compare', help='flag the timings that got slower than a baseline')
+    compare.add_argument('baseline', help='results of an earlier run')
+    compare.add_argument('current', help='results of the run to check')
+    compare.add_argument('--tolerance', type=float, default=0.2, help='fraction a timing may grow by before it is flagged')
+
+    work = commands.add_parser('precision', help='the error against a reference run and the wall time of every backend, integrator and time step')
+    work.add_argument('scene', help='a prebuilt scene by number or name (see run_headless.py) or one of: %s' % ', '.join(SCENES))
+    work.add_argument('--bodies', type=int, default=10, help='body count of the benchmark scenes')
+    work.add_argument('--particles', type=int, default=0, help='particle count of the benchmark scenes')
+    work.add_argument('--backends', type=_names, default=['numpy'], help='comma separated: %s' % ', '.join(BACKENDS))
+    work.add_argument('--integrators', type=_names, default=['euler', 'leapfrog', 'yoshida4', 'yoshida6'], help='comma separated: %s' % ', '.join(INTEGRATORS))
+    work.add_argument('--dtypes', type=_names, default=['float64'], help='comma separated float64 and/or float32')
+    work.add_argument('--steps', type=_steps, default=[86400, 21600, 3600], help='comma separated time steps in simulated seconds')
+    work.add_argument('--duration', type=float, default=90 * 86400, help='simulated seconds every run covers')
+    work.add_argument('--reference-integrator', default='yoshida6', help='integrator of the reference run (on the numpy kernels, in float64)')
+    work.add_argument('--reference-factor', type=int, default=8, help='the reference step is the smallest of --steps over this')
+    work.add_argument('--target', type=float, default=None, help='report the fastest run with every error below this')
+    work.add_argument('--seed', type=int, default=0, help='random seed for the scenes built at random')
+    work.add_argument('--output', default=None, help='also write the results to this JSON file')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        unknown = [name for name in args.scenes if name not in SCENES] + [name for name in args.backends if name not in BACKENDS]
+        if unknown:
+            parser.error('unknown scene or backend: %s' % ', '.join(unknown))
+        results = scaling.run(args.scenes, args.backends, args.bodies, args.particles, args.integrator, args.repeat, args.max_seconds)
+        scaling.save(results, args.output, {'integrator': args.integrator, 'repeat': args.repeat, 'max_seconds': args.max_seconds})
+        print('Saved %d results to %s' % (len(results), args.output))
+    elif args.command == 'compare':
+        regressions = scaling.compare(scaling.load(args.baseline), scaling.load(args.current), args.tolerance)
+        print('%d regression(s) beyond %.0f%%' % (len(regressions), args.tolerance * 100))
+        return 1 if regressions else 0
+    elif args.command == 'precision':
+        return _precision(parser, args)
+    else:
+        parser.print_help()
+        return 2
+
+def _precision(parser, args):
+    if args.scene in SCENES:
+        builder = SCENES[args.scene](args.bodies, args.particles)
+    else:
+        try:
+            builder = find_scene(args.scene)
+        except ValueError as e:
+            parser.error(str(e))
+    unknown = [name for name in args.backends if name not in BACKENDS] + [name for name in args.integrators if name not in INTEGRATORS] + \
+              [name for name in args.dtypes if name not in ('float64', 'float32')]
+    if unknown:
+        parser.error('unknown backend, integrator or dtype: %s' % ', '.join(unknown))
+    if args.reference_integrator not in INTEGRATORS:
+        parser.error("unknown integrator '%s'" % args.reference_integrator)
+
+    reference, records = precision.run(builder, args.backends, args.integrators, args.steps, args.duration, args.dtypes,
+                                       args.reference_integrator, args.reference_factor, args.seed)
+    print('\nFastest first:')
+    for record in sorted(records, key=lambda record: record.get('wall', float('inf'))):
+        if 'error' not in record:
+            print('%9.3f s  %-12s %-14s %-8s step %10g s  worst %.2e' % (
+                record['wall'], record['backend'], record['integrator'], record['dtype'], record['step'], precision.worst(record['errors'])))
+    if args.target is not None:
+        best = precision.cheapest(records, args.target)
+        if best is None:
+            print('No run is within %g of the reference' % args.target)
+        else:
+            print('Cheapest within %g: %s / %s / %s with a step of %g s (%.3f s)' % (
+                args.target, best['backend'], best['integrator'], best['dtype'], best['step'], best['wall']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'fingerprint': machine_fingerprint(), 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'scene': builder.__name__, 'duration': args.duration, 'reference': reference, 'results': records}, f, indent=2)
+        print('Saved %d results to %s' % (len(records), args.output))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
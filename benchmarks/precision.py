@@ -0,0 +1,157 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Work-precision benchmarks: runs a scene for the same simulated time with every backend, integrator and time step chosen
+# and measures how far each run ends up from a reference run (the numpy kernels with a high order integrator at a much
+# smaller step, in float64) against the wall time it took.
+# The errors are relative: energy against the reference's, angular momentum against the size of the reference's motions
+# (sum of m*|r|*|v| about the center of mass), body positions as the largest miss over the
+# bodies' spread around their center of mass, and particles (matched by id) as the median of their miss over their distance
+# to the nearest body (the fraction of its orbit a ring particle is off by), plus the fraction of the reference's particles
+# the run lost (a run that lost every particle has nothing to match, its particle error is inf).
+# The reference is also run at twice its step, how far apart the two are is the accuracy the others are measured to.
+#--------------------------------#
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from engine.backends import BACKENDS, get_backend
+
+def _state(gravity):
+    #The massive things (bodies and particles with mass) and the live particles, in float64 world coordinates.
+    coord = gravity.verts_coord.astype(np.float64) + gravity.origin
+    vel = gravity.verts_vel.astype(np.float64)
+    mass = gravity.verts_mass.astype(np.float64)
+    state = {'verts_coord': coord, 'parts_coord': np.zeros((0, 3)), 'parts_id': np.zeros(0, dtype=int)}
+    if gravity.parts_coord is not None:
+        alive = gravity._parts_pool.alive[:gravity._parts_pool.live] if gravity._parts_pool is not None else slice(None)
+        state['parts_coord'] = gravity.parts_coord[alive].astype(np.float64) + gravity.origin
+        state['parts_id'] = np.asarray(gravity.parts_id[alive])
+        if gravity.parts_mass is not None:
+            coord = np.concatenate((coord, state['parts_coord']))
+            vel = np.concatenate((vel, gravity.parts_vel[alive].astype(np.float64)))
+            mass = np.concatenate((mass, gravity.parts_mass[alive].astype(np.float64)))
+    state['energy'] = 0.5 * np.dot(mass, np.einsum('ij,ij->i', vel, vel)) + potential_energy(coord, mass, gravity.G)
+    state['angular_momentum'] = np.dot(mass, np.cross(coord, vel))
+    #(the size of the angular momenta in play, the total can be near zero when the motions cancel out)
+    center, drift = np.dot(mass, coord) / mass.sum(), np.dot(mass, vel) / mass.sum()
+    state['momentum_scale'] = np.dot(mass, np.linalg.norm(coord - center, axis=1) * np.linalg.norm(vel - drift, axis=1))
+    return state
+
+def potential_energy(coord, mass, G, block=1024):
+    #-G * sum over pairs of m_i * m_j / r_ij, a block of rows at a time so big particle clouds fit in memory.
+    total = 0.
+    for start in range(0, coord.shape[0], block):
+        rows = slice(start, start + block)
+        dist = np.sqrt(np.sum((coord[rows, None, :] - coord[None, :, :]) ** 2, axis=2))
+        upper = np.arange(coord.shape[0])[None, :] > np.arange(start, start + dist.shape[0])[:, None] #(each pair once)
+        with np.errstate(divide='ignore'):
+            total -= G * np.sum(np.where(upper, mass[rows, None] * mass[None, :] / dist, 0.))
+    return total
+
+def nearest_distance(coord, bodies, block=1024):
+    #Every point's distance to the nearest of the bodies, a block of points at a time.
+    nearest = np.empty(coord.shape[0])
+    for start in range(0, coord.shape[0], block):
+        rows = slice(start, start + block)
+        nearest[rows] = np.sqrt(np.min(np.sum((coord[rows, None, :] - bodies[None, :, :]) ** 2, axis=2), axis=1))
+    return nearest
+
+def simulate(builder, backend, integrator, dt, duration, dtype=np.float64, seed=0):
+    #Run the scene for duration simulated seconds in steps of dt (one step per update()), returns its end state and the wall time.
+    np.random.seed(seed)
+    gravity = get_backend(backend)(builder, integrator)
+    try:
+        if np.dtype(dtype) != np.dtype(gravity.dtype): #(the precision is set up when the scene loads, so load it again)
+            gravity.dtype = dtype
+            np.random.seed(seed)
+            gravity.__reset_universe__()
+        gravity.time_scale = dt / 0.01 #(see update())
+        steps = int(round(duration / dt))
+        start = time.perf_counter()
+        for _ in range(steps):
+            gravity.update()
+        wall = time.perf_counter() - start
+        return _state(gravity), wall
+    finally:
+        if hasattr(gravity, 'close'):
+            gravity.close()
+
+def errors(state, reference):
+    #How far a run's end state is from the reference's (None where the bodies merged differently and cannot be matched).
+    energy = abs(state['energy'] - reference['energy']) / abs(reference['energy'])
+    momentum = np.linalg.norm(state['angular_momentum'] - reference['angular_momentum']) / reference['momentum_scale']
+
+    coord = reference['verts_coord']
+    spread = np.sqrt(np.mean(np.sum((coord - coord.mean(axis=0)) ** 2, axis=1))) or 1. #(a single body has no spread, the miss is in meters)
+    bodies = None
+    if state['verts_coord'].shape == coord.shape:
+        bodies = np.sqrt(np.sum((state['verts_coord'] - coord) ** 2, axis=1)).max() / spread
+    particles = missing = None
+    common, mine, theirs = np.intersect1d(state['parts_id'], reference['parts_id'], return_indices=True)
+    if reference['parts_id'].shape[0]:
+        missing = 1 - common.shape[0] / float(reference['parts_id'].shape[0])
+        particles = np.inf #(unless some are left to compare)
+    if common.shape[0] and coord.shape[0]:
+        miss = np.sqrt(np.sum((state['parts_coord'][mine] - reference['parts_coord'][theirs]) ** 2, axis=1))
+        particles = np.median(miss / nearest_distance(reference['parts_coord'][theirs], coord))
+    return OrderedDict([('energy', float(energy)), ('angular_momentum', float(momentum)),
+                        ('bodies', None if bodies is None else float(bodies)),
+                        ('particles', None if particles is None else float(particles)),
+                        ('missing', None if missing is None else float(missing))])
+
+def worst(error):
+    #The largest of a run's errors (inf when its bodies could not be matched to the reference's, or none of its particles).
+    if error['bodies'] is None:
+        return np.inf
+    return max(value for value in error.values() if value is not None)
+
+def run(builder, backends, integrators, steps, duration, dtypes=('float64',), reference_integrator='yoshida6',
+        reference_factor=8, seed=0, log=print):
+    #The reference run and every backend / integrator / dtype / step run against it, returns (reference record, records).
+    dt = min(steps) / float(reference_factor)
+    log('Reference: numpy / %s, step %g s over %g s' % (reference_integrator, dt, duration))
+    reference, wall = simulate(builder, 'numpy', reference_integrator, dt, duration, seed=seed)
+    coarse, _ = simulate(builder, 'numpy', reference_integrator, 2 * dt, duration, seed=seed)
+    floor = errors(coarse, reference)
+    log('Reference took %.2f s, accurate to about %s' % (wall, _format(floor)))
+    reference_record = OrderedDict([('integrator', reference_integrator), ('step', dt), ('wall', wall), ('errors', floor)])
+
+    records = []
+    backends = [name for name in BACKENDS if name in backends] #(in the registry's order)
+    for backend in backends:
+        try:
+            get_backend(backend)
+        except ImportError as e:
+            log("Skipping backend '%s' (%s)" % (backend, e))
+            continue
+        for integrator in integrators:
+            for dtype in dtypes:
+                try: #(warm up first, so jit compiling and starting pools or graphs is not timed)
+                    simulate(builder, backend, integrator, max(steps), max(steps), np.dtype(dtype).type, seed)
+                except Exception:
+                    pass #(the runs below record the failure)
+                for step in sorted(steps, reverse=True):
+                    record = OrderedDict([('backend', backend), ('integrator', integrator), ('dtype', dtype), ('step', step)])
+                    try:
+                        state, wall = simulate(builder, backend, integrator, step, duration, np.dtype(dtype).type, seed)
+                    except Exception as e:
+                        record['error'] = str(e)
+                        log('%-12s %-14s %-8s step %10g s failed (%s)' % (backend, integrator, dtype, step, e))
+                        records.append(record)
+                        continue
+                    record['wall'] = wall
+                    record['errors'] = errors(state, reference)
+                    records.append(record)
+                    log('%-12s %-14s %-8s step %10g s %9.3f s  %s' % (backend, integrator, dtype, step, wall, _format(record['errors'])))
+    return reference_record, records
+
+def cheapest(records, target):
+    #The fastest run whose errors are all within target (None if none is).
+    good = [record for record in records if 'error' not in record and worst(record['errors']) <= target]
+    return min(good, key=lambda record: record['wall']) if good else None
+
+def _format(error):
+    return '  '.join('%s %s' % (name, '-' if value is None else '%.2e' % value) for name, value in error.items())
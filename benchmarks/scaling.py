@@ -0,0 +1,136 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Scaling benchmarks: times update() and the force kernels of every backend over a sweep of body and particle counts,
+# saves the results with the machine's fingerprint as JSON and compares a run against a stored baseline.
+# A backend stops growing a scene once an update() takes longer than max_seconds (that is where it stopped scaling).
+#--------------------------------#
+
+import json
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from engine.backends import BACKENDS, get_backend, machine_fingerprint
+from engine.gravity_vectorized import newtonianLawOfGravitation
+from .scenes import SCENES, FIXED_BODIES
+
+def kernels(gravity):
+    #The force kernels of the engine timed on their own (a graph stepping backend has none outside of its graph).
+    if gravity.sess is not None:
+        return OrderedDict()
+    timers = OrderedDict()
+    timers['body_accelerations'] = lambda: gravity._body_accelerations(gravity.verts_coord)
+    if gravity.parts_coord is not None and gravity.parts_coord.shape[0]:
+        timers['particle_accelerations'] = lambda: gravity._particle_accelerations(gravity.parts_coord)
+    return timers
+
+def time_call(call, repeat):
+    #Best and median seconds of repeat calls.
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': float(np.median(times))}
+
+def run_case(scene, backend, integrator, bodies, particles, repeat=5, time_scale=1, seed=0):
+    #Time one scene size on one backend, returns the result record (with the counts the scene actually has).
+    np.random.seed(seed)
+    gravity = get_backend(backend)(SCENES[scene](bodies, particles), integrator)
+    try:
+        gravity.time_scale = time_scale
+        gravity.update() #warm up (jit compiling, pools and graphs starting)
+        record = OrderedDict([
+            ('scene', scene), ('backend', backend), ('integrator', gravity.integrator),
+            ('bodies', int(gravity.verts_coord.shape[0])),
+            ('particles', int(gravity.parts_coord.shape[0]) if gravity.parts_coord is not None else 0),
+        ])
+        timings = OrderedDict()
+        timings['update'] = time_call(gravity.update, repeat)
+        for name, call in kernels(gravity).items():
+            call()
+            timings[name] = time_call(call, repeat)
+        record['timings'] = timings
+        return record
+    finally:
+        if hasattr(gravity, 'close'):
+            gravity.close()
+
+def run(scenes, backends, bodies, particles, integrator=None, repeat=5, max_seconds=2., log=print):
+    #The whole sweep, smallest scenes first. A backend that fails or gets slower than max_seconds per update()
+    #skips the bigger sizes of that scene.
+    results = []
+    integrator = integrator or newtonianLawOfGravitation.integrator
+    backends = [name for name in BACKENDS if name in backends] #(in the registry's order)
+    for backend in backends:
+        try:
+            get_backend(backend)
+        except ImportError as e:
+            log("Skipping backend '%s' (%s)" % (backend, e))
+            continue
+        for scene in scenes:
+            sizes = sorted(set((FIXED_BODIES.get(scene, n), p) for n in bodies for p in particles), key=lambda size: (size[0] * size[1], size))
+            too_slow = None
+            for n, p in sizes:
+                if too_slow is not None and n >= too_slow[0] and p >= too_slow[1]:
+                    continue
+                try:
+                    record = run_case(scene, backend, integrator, n, p, repeat)
+                except Exception as e:
+                    log('%-18s %-12s bodies %6d particles %8d failed (%s)' % (scene, backend, n, p, e))
+                    results.append(OrderedDict([('scene', scene), ('backend', backend), ('integrator', integrator),
+                                                ('bodies', n), ('particles', p), ('error', str(e))]))
+                    too_slow = (n, p)
+                    continue
+                results.append(record)
+                log('%-18s %-12s bodies %6d particles %8d  ' % (scene, backend, record['bodies'], record['particles']) +
+                    '  '.join('%s %.3g ms' % (name, t['best'] * 1e3) for name, t in record['timings'].items()))
+                if record['timings']['update']['best'] > max_seconds:
+                    too_slow = (n, p)
+    return results
+
+def save(results, path, settings=None):
+    with open(path, 'w') as f:
+        json.dump({'fingerprint': machine_fingerprint(), 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'settings': settings or {}, 'results': results}, f, indent=2)
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _key(record):
+    return (record['scene'], record['backend'], record['integrator'], record['bodies'], record['particles'])
+
+def compare(baseline, current, tolerance=0.2, log=print):
+    #The timings (by best time) that got slower than the baseline by more than the tolerance fraction,
+    #as (scene, backend, integrator, bodies, particles, timer, baseline seconds, current seconds).
+    if baseline['fingerprint'] != current['fingerprint']:
+        log('Warning: the runs were made on different machines or setups, the comparison is only a rough guide')
+        for name in sorted(set(baseline['fingerprint']) | set(current['fingerprint'])):
+            if baseline['fingerprint'].get(name) != current['fingerprint'].get(name):
+                log('  %s: %s -> %s' % (name, baseline['fingerprint'].get(name), current['fingerprint'].get(name)))
+
+    base = dict((_key(record), record) for record in baseline['results'])
+    regressions = []
+    for record in current['results']:
+        old = base.get(_key(record))
+        if old is None or 'error' in old:
+            continue
+        if 'error' in record:
+            regressions.append(_key(record) + ('error', None, None))
+            log('!!  %-18s %-12s %-10s bodies %6d particles %8d failed (%s)' % (
+                record['scene'], record['backend'], record['integrator'], record['bodies'], record['particles'], record['error']))
+            continue
+        for name, t in record['timings'].items():
+            if name not in old['timings']:
+                continue
+            before, after = old['timings'][name]['best'], t['best']
+            flag = after > before * (1 + tolerance)
+            if flag:
+                regressions.append(_key(record) + (name, before, after))
+            log('%-3s %-18s %-12s %-10s bodies %6d particles %8d %-24s %10.3f ms -> %10.3f ms (%+.0f%%)' % (
+                '!!' if flag else '', record['scene'], record['backend'], record['integrator'], record['bodies'], record['particles'],
+                name, before * 1e3, after * 1e3, (after / before - 1) * 100 if before else 0))
+    return regressions
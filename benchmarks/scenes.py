@@ -0,0 +1,110 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Scene builders of any size for the benchmarks: the prebuilt scenes with their counts swapped out, and synthetic ones.
+# Each function returns a builder class like the ones in builder/prebuilds.py (the engine builds it on load).
+#--------------------------------#
+
+import numpy as np
+
+from builder.prebuilds import Scene_RandomSpheres, Scene_SaturnVsJupiter
+from builder.extras.planet_models import Saturn, Jupiter
+from builder.extras.planet_params import MassJupiter, RadiusJupiter, RadiusEarth, ColorEarth
+
+def random_spheres(bodies, particles):
+    #Scene_RandomSpheres with the counts given.
+    return type('Scene_RandomSpheres_%d_%d' % (bodies, particles), (Scene_RandomSpheres,),
+                {'n_bodies': bodies, 'n_particles': particles})
+
+def saturn_vs_jupiter(bodies, particles):
+    #Scene_SaturnVsJupiter with the given number of ring particles (it always has its 2 bodies).
+    def __init__(self, size_scale):
+        self.size_scale = size_scale
+        saturn = Saturn(self)
+        saturn.n_particles = max(particles, saturn.ring_groups * saturn.ring_bands)
+        saturn.create(pos=(0, 0, 0), vel=(0, 0, 0))
+        Jupiter(self).create(pos=(1 * 10 ** 9, 0, 1.0 * 10 ** 9), vel=(7500, 0, 0))
+    return type('Scene_SaturnVsJupiter_%d' % particles, (Scene_SaturnVsJupiter,), {'__init__': __init__})
+
+class Scene_Swarm():
+    #Jupiter sized attractors scattered at rest through a box, each with a cloud of particles on circular orbits around it.
+    n_bodies = 40
+    n_particles = 20000
+    box = 2 * 10 ** 11 #width of the box the attractors are scattered in (meters)
+    min_rad = 1 * 10 ** 8 #the clouds' inner and outer radius
+    max_rad = 2 * 10 ** 9
+
+    verts_coord = None
+    verts_radius = None
+    verts_color = None
+    verts_vel = None
+    verts_mass = None
+
+    parts_coord = None
+    parts_radius = None
+    parts_color = None
+    parts_vel = None
+    parts_mass = None
+
+    def __init__(self, size_scale):
+        self.size_scale = size_scale
+        n, p = self.n_bodies, self.n_particles
+        self.verts_coord = (np.random.ranf((n, 3)) - 0.5) * self.box
+        self.verts_vel = np.zeros((n, 3))
+        self.verts_mass = (np.random.ranf(n) * 0.9 + 0.1) * MassJupiter
+        self.verts_radius = np.ones(n) * RadiusJupiter
+        self.verts_color = np.tile([1.0, 0.6, 0.2, 1.0], (n, 1))
+
+        host = np.arange(p) % n
+        direction = np.random.normal(size=(p, 3))
+        direction /= np.linalg.norm(direction, axis=1)[:, None]
+        rad = np.random.ranf(p) * (self.max_rad - self.min_rad) + self.min_rad
+        self.parts_coord = self.verts_coord[host] + direction * rad[:, None]
+        along = np.cross(direction, np.random.normal(size=(p, 3))) #(any direction square to the radius)
+        along /= np.linalg.norm(along, axis=1)[:, None]
+        self.parts_vel = along * np.sqrt(6.674 * 10 ** -11 * self.verts_mass[host] / rad)[:, None]
+        self.parts_radius = np.ones(p) * RadiusEarth
+        self.parts_color = np.tile(np.array([1.0, 1.0, 1.0, 1.0]) * ColorEarth, (p, 1)).astype(np.float32)
+        if p == 0:
+            self.parts_coord = None
+
+    def get_array_size(self):
+        if self.parts_coord is not None:
+            return self.verts_coord.shape[0] + self.parts_coord.shape[0]
+        return self.verts_coord.shape[0]
+
+def swarm(bodies, particles):
+    return type('Scene_Swarm_%d_%d' % (bodies, particles), (Scene_Swarm,), {'n_bodies': bodies, 'n_particles': particles})
+
+class Scene_Binaries(Scene_Swarm):
+    #The swarm's attractors (without particles) where a few of them have a close companion on a circular orbit, the kind of
+    #scene the block integrator is for: the pairs need steps of minutes while everything else could take days.
+    n_bodies = 200
+    n_particles = 0
+    n_binaries = 2
+    separation = 2 * 10 ** 8 #meters between the two bodies of a pair
+
+    def __init__(self, size_scale):
+        Scene_Swarm.__init__(self, size_scale)
+        k = min(self.n_binaries, self.verts_coord.shape[0])
+        mass = self.verts_mass[:k]
+        speed = np.sqrt(6.674 * 10 ** -11 * mass / (2 * self.separation)) #(each one around the pair's center of mass)
+        self.verts_vel[:k, 2] = speed
+        self.verts_coord = np.concatenate((self.verts_coord, self.verts_coord[:k] + [self.separation, 0, 0]))
+        self.verts_vel = np.concatenate((self.verts_vel, np.stack((np.zeros(k), np.zeros(k), -speed), axis=1)))
+        self.verts_mass = np.concatenate((self.verts_mass, mass))
+        self.verts_radius = np.concatenate((self.verts_radius, self.verts_radius[:k]))
+        self.verts_color = np.concatenate((self.verts_color, self.verts_color[:k]))
+
+def binaries(bodies, particles):
+    #Scene_Binaries with the given number of bodies in all (its n_binaries companions included).
+    k = Scene_Binaries.n_binaries
+    return type('Scene_Binaries_%d_%d' % (bodies, particles), (Scene_Binaries,), {'n_bodies': max(bodies - k, k), 'n_particles': particles})
+
+SCENES = {
+    'random_spheres': random_spheres,
+    'saturn_vs_jupiter': saturn_vs_jupiter,
+    'swarm': swarm,
+    'binaries': binaries,
+}
+FIXED_BODIES = {'saturn_vs_jupiter': 2} #scenes whose body count does not change (only their particle counts are swept)
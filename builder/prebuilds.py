@@ -10,6 +10,7 @@ def get_scene_list():
         ("1. Simple Solar System", Scene_SolarSystem),
         ("2. Saturn Vs. Jupiter", Scene_SaturnVsJupiter),
         ("3. Random Massive Spheres", Scene_RandomSpheres),
+        ("4. Self-Gravitating Particle Cloud", Scene_ParticleCloud),
     )
 
 class Scene_SolarSystem():
@@ -27,6 +28,7 @@ class Scene_SolarSystem():
     parts_radius = None
     parts_color = None
     parts_vel = None
+    parts_mass = None #Optional (particles with mass also pull on each other)
 
     def __init__(self, size_scale):
         self.size_scale = size_scale
@@ -58,6 +60,7 @@ class Scene_SaturnVsJupiter():
     parts_radius = None
     parts_color = None
     parts_vel = None
+    parts_mass = None #Optional (particles with mass also pull on each other)
 
     def __init__(self, size_scale):
         self.size_scale = size_scale
@@ -94,6 +97,7 @@ class Scene_RandomSpheres():
     parts_radius = None
     parts_color = None
     parts_vel = None
+    parts_mass = None #Optional (particles with mass also pull on each other)
 
     def __init__(self, size_scale):
         self.size_scale = size_scale
@@ -128,3 +132,54 @@ class Scene_RandomSpheres():
 
     def get_array_size(self):
         return self.verts_coord.shape[0] + self.parts_coord.shape[0]
+
+class Scene_ParticleCloud():
+    #A rotating disk of particles that have mass (together as heavy as Jupiter) around a single Jupiter sized body.
+
+    n_particles = 100000
+    cloud_mass = MassJupiter
+    min_rad = 2 * 10 ** 8
+    max_rad = 2 * 10 ** 9
+    thickness = 1 * 10 ** 8
+
+    verts_coord = None
+    verts_radius = None
+    verts_color = None
+    verts_vel = None
+    verts_mass = None
+
+    parts_coord = None
+    parts_radius = None
+    parts_color = None
+    parts_vel = None
+    parts_mass = None
+
+    def __init__(self, size_scale):
+        self.size_scale = size_scale
+
+        Jupiter(self).create(pos=(0, 0, 0), vel=(0, 0, 0))
+        self.__initialize_cloud__()
+
+    def __initialize_cloud__(self):
+        n = self.n_particles
+        rad = np.sqrt(np.random.ranf(n) * (self.max_rad ** 2 - self.min_rad ** 2) + self.min_rad ** 2) #evenly spread over the disk's area
+        angle = np.random.ranf(n) * 2 * np.pi
+
+        self.parts_coord = np.zeros((n, 3))
+        self.parts_coord[:, 0] = rad * np.cos(angle)
+        self.parts_coord[:, 1] = (np.random.ranf(n) - 0.5) * self.thickness
+        self.parts_coord[:, 2] = rad * np.sin(angle)
+
+        #circular orbits around the body plus the part of the cloud that is inside of each particle's orbit
+        enclosed = MassJupiter + self.cloud_mass * (rad ** 2 - self.min_rad ** 2) / (self.max_rad ** 2 - self.min_rad ** 2)
+        speed = np.sqrt(6.674 * 10 ** -11 * enclosed / rad)
+        self.parts_vel = np.zeros((n, 3))
+        self.parts_vel[:, 0] = -speed * np.sin(angle)
+        self.parts_vel[:, 2] = speed * np.cos(angle)
+
+        self.parts_mass = np.ones(n) * self.cloud_mass / n
+        self.parts_radius = np.ones(n) * RadiusMoon
+        self.parts_color = np.tile(np.array(ColorSaturnRing1), (n, 1)).astype(np.float32)
+
+    def get_array_size(self):
+        return self.verts_coord.shape[0] + self.parts_coord.shape[0]
@@ -0,0 +1,120 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Acceleration lookup grids for massless particles.
+# Every body carries a coarse cube grid of the pull of all the other bodies, which is smooth around it as long as the cube
+# keeps clear of them: its corners stay within reach of half the gap to the nearest other body's surface.
+# A particle inside a body's cube gets that body's exact pull plus the others' pull interpolated (trilinear) from the grid,
+# so its cost does not depend on the number of bodies. The grids move with their bodies and are rebuilt by the engine
+# once the bodies moved a grid cell relative to each other (or every so many steps), particles outside every cube fall back to the direct sum.
+#--------------------------------#
+
+import numpy as np
+
+from .direct import direct_accelerations
+from .collisions import SpatialHash
+
+class AccelerationGrids():
+    def __init__(self, coord, mass, radius, G, size=8, reach=0.5, max_particle_radius=0.):
+        coord = np.asarray(coord, dtype=np.float64)
+        mass = np.asarray(mass, dtype=np.float64)
+        n = coord.shape[0]
+        self.size = size
+        self.count = n
+        self.coord = coord #where the bodies were when the grids were built
+
+        #the cube's circumscribed sphere reaches at most reach of the way to the nearest other body's surface
+        #(with reach <= 0.5 no two cubes overlap, and a particle in a cube can only touch that cube's body)
+        slope = coord[None, :, :] - coord[:, None, :]
+        gap = np.sqrt(np.einsum('ijk,ijk->ij', slope, slope)) - np.asarray(radius, dtype=np.float64)[None, :] - max_particle_radius
+        gap[np.arange(n), np.arange(n)] = np.inf
+        self.half = np.maximum(reach * gap.min(axis=1), 0) / np.sqrt(3) if n > 1 else np.full(n, np.inf)
+
+        #the nodes run from -half to +half along each axis around the body, the others' pull at each of them
+        axis = np.linspace(-1, 1, size)
+        nodes = np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1).reshape(-1, 3)
+        self.field = np.zeros((n, size, size, size, 3))
+        others = np.ones(n, dtype=bool)
+        for b in range(n):
+            if not np.isfinite(self.half[b]) or self.half[b] == 0:
+                continue
+            others[b] = False
+            points = coord[b] + self.half[b] * nodes
+            self.field[b] = direct_accelerations(points, coord[others], mass[others], G)[0].reshape(size, size, size, 3)
+            others[b] = True
+        self.covered = np.flatnonzero(np.isfinite(self.half) & (self.half > 0))
+
+    def moved(self, coord):
+        #Whether the bodies moved apart or together since the grids were built by more than a grid cell of one of them
+        #(the grids move with their bodies, but the pull of the others in them only holds while they keep their places).
+        if coord.shape[0] != self.count:
+            return True
+        shift = np.asarray(coord, dtype=np.float64) - self.coord
+        apart = shift[None, :, :] - shift[:, None, :]
+        apart = np.sqrt(np.einsum('ijk,ijk->ij', apart, apart)).max(axis=1)
+        return bool((apart > 2 * self.half / (self.size - 1)).any())
+
+    def hosts(self, points, coord, guess=None):
+        #The body whose cube each point is in (the cube as it is now, centered on the body), -1 for points in none.
+        #guess is each point's host last time, the points that are still in it skip the search.
+        if self.count == 1:
+            return np.zeros(points.shape[0], dtype=int) #(a lone body's cube covers everything, there is nothing else to pull)
+        host = np.full(points.shape[0], -1)
+        search = np.arange(points.shape[0])
+        if guess is not None and guess.shape[0] == points.shape[0]:
+            guessed = np.flatnonzero(guess >= 0)
+            b = guess[guessed]
+            still = np.all(np.abs(points[guessed] - coord[b]) <= self.half[b, None], axis=1)
+            host[guessed[still]] = b[still]
+            search = np.flatnonzero(host < 0)
+        if self.covered.shape[0] == 0 or search.shape[0] == 0:
+            return host
+        #(hashed where the bodies are now, the cubes moved with them)
+        rows, bodies = SpatialHash(coord[self.covered], self.half[self.covered] * np.sqrt(3)).candidates(points[search])
+        rows, bodies = search[rows], self.covered[bodies]
+        inside = np.all(np.abs(points[rows] - coord[bodies]) <= self.half[bodies, None], axis=1)
+        host[rows[inside]] = bodies[inside]
+        return host
+
+    def sample(self, points, host, coord):
+        #The others' pull at points inside their host's cube, interpolated between the eight nodes around each.
+        accel = np.zeros(points.shape, dtype=np.float64)
+        if self.count == 1:
+            return accel
+        cell = (points - coord[host]) / self.half[host, None] * 0.5 + 0.5 #(0 to 1 across the cube)
+        cell = np.clip(cell, 0, 1) * (self.size - 1)
+        low = np.minimum(cell.astype(int), self.size - 2)
+        w = cell - low
+        size = self.size
+        base = ((host * size + low[:, 0]) * size + low[:, 1]) * size + low[:, 2] #(rows of the flattened field)
+        field = self.field.reshape(-1, 3)
+        for corner in np.ndindex(2, 2, 2):
+            weight = (w[:, 0] if corner[0] else 1 - w[:, 0]) * (w[:, 1] if corner[1] else 1 - w[:, 1]) * (w[:, 2] if corner[2] else 1 - w[:, 2])
+            accel += weight[:, None] * field[base + (corner[0] * size + corner[1]) * size + corner[2]]
+        return accel
+
+    def accelerations(self, points, radius, coord, mass, body_radius, G, guess=None):
+        #The gforce on every point and the mask of those not touching a body, like direct_accelerations with radii.
+        #Also returns the points' hosts (the guess for the next call).
+        host = self.hosts(points, coord, guess)
+        inside = np.flatnonzero(host >= 0)
+        outside = np.flatnonzero(host < 0)
+        accel = np.zeros(points.shape, dtype=points.dtype)
+        uncollided = np.ones(points.shape[0], dtype=bool)
+
+        if inside.shape[0]:
+            #the host's own pull exactly, the others' from its grid
+            h = host[inside]
+            slope = coord[h].astype(np.float64) - points[inside]
+            space = np.einsum('ij,ij->i', slope, slope)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inv_hyp = 1 / np.sqrt(space)
+            inv_hyp[space == 0] = 0
+            pull = G * mass[h] * inv_hyp * inv_hyp * inv_hyp
+            accel[inside] = pull[:, None] * slope + self.sample(points[inside], h, coord)
+            reach = body_radius[h] + radius[inside]
+            uncollided[inside] = space > reach * reach
+        if outside.shape[0]:
+            accel[outside], uncollided[outside] = direct_accelerations(points[outside], coord, mass, G,
+                                                                       target_radius=radius[outside], source_radius=body_radius)
+        return accel, uncollided, host
@@ -0,0 +1,136 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Registry of the physics backends (every one is a newtonianLawOfGravitation with its own force kernels).
+# The frontends create their engine by name with create_gravity(builder, name), where "auto" times a few steps of
+# every available backend on the loaded scene and remembers the fastest one per machine, scene and integrator.
+#--------------------------------#
+
+import os
+import json
+import time
+import inspect
+import platform
+import importlib
+from collections import OrderedDict
+from multiprocessing import cpu_count
+
+import numpy as np
+
+BACKENDS = OrderedDict() #name -> (module, class name), the modules are only imported when the backend is used
+
+def register_backend(name, module, class_name):
+    BACKENDS[name] = (module, class_name)
+
+#(auto calibrates them in this order)
+register_backend('numpy', '.gravity_vectorized', 'newtonianLawOfGravitation')
+register_backend('multiprocess', '.multiprocess', 'multiprocessGravitation')
+register_backend('numba', '.gravity_numba', 'numbaGravitation')
+register_backend('barnes_hut', '.barnes_hut', 'barnesHutGravitation')
+register_backend('fmm', '.fast_multipole', 'fastMultipoleGravitation')
+register_backend('tensorflow', '.gravity_vectorized_tensorflow', 'tensorflowGravitation')
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.gravityvr', 'backend_cache.json')
+calibration_steps = 3 #timed steps per backend (after one untimed warm up step)
+
+def get_backend(name):
+    #The engine class registered under the name (raises ImportError when its dependencies are not installed).
+    if name not in BACKENDS:
+        raise KeyError("Unknown physics backend '%s', choose one of: %s" % (name, ', '.join(list(BACKENDS) + ['auto'])))
+    module, class_name = BACKENDS[name]
+    cls = getattr(importlib.import_module(module, __package__), class_name)
+    if not getattr(cls, 'available', True):
+        raise ImportError("The '%s' backend is not available on this machine" % name)
+    return cls
+
+def available_backends():
+    names = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+def create_gravity(builder, backend='numpy', integrator=None):
+    #Create the physics engine for the scene builder using the named backend (or "auto") and integrator (see integrators.py).
+    if backend == 'auto':
+        backend = auto_select(builder, integrator=integrator)
+    return get_backend(backend)(builder, integrator)
+
+def machine_fingerprint():
+    return {
+        'node': platform.node(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+    }
+
+def _builder_params(builder):
+    #The builder's settings (its public class attributes holding plain values, like n_bodies and n_particles, inherited ones too).
+    #They decide the scene's size so the key is made from them, without building the whole scene just to count it.
+    params = {}
+    for cls in reversed(inspect.getmro(builder)):
+        for name, value in vars(cls).items():
+            if not name.startswith('_') and isinstance(value, (bool, int, float, str)):
+                params[name] = value
+    return ','.join('%s=%r' % item for item in sorted(params.items()))
+
+def _cache_key(builder, integrator=None):
+    fingerprint = machine_fingerprint()
+    integrator = integrator or get_backend('numpy').integrator #(the engines' default, so None and its name share an entry)
+    return '%s|%s|%s|%s.%s|%s|%s' % (fingerprint['node'], fingerprint['machine'], fingerprint['cpu_count'],
+                                     builder.__module__, builder.__name__, _builder_params(builder), integrator)
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def calibrate(builder, names=None, integrator=None):
+    #Seconds per update() of every available backend on the scene with the integrator (backends that fail to run are left out).
+    #The integrators weigh the kernels differently (hermite's jerks, block's partial sums) so the fastest depends on it.
+    timings = OrderedDict()
+    for name in names or available_backends():
+        gravity = None
+        try:
+            gravity = get_backend(name)(builder, integrator)
+            gravity.update() #warm up (jit compiling, pools and graphs starting)
+            start = time.time()
+            for _ in range(calibration_steps):
+                gravity.update()
+            timings[name] = (time.time() - start) / calibration_steps
+        except Exception as e:
+            print("Skipping physics backend '%s' (%s)" % (name, e))
+        finally:
+            if hasattr(gravity, 'close'):
+                gravity.close()
+    return timings
+
+def auto_select(builder, cache_path=None, recalibrate=False, integrator=None):
+    #The fastest backend for this scene (its builder and settings) and the integrator, calibrated once and then read from the cache file.
+    cache_path = cache_path or CACHE_PATH
+    key = _cache_key(builder, integrator)
+    cache = _load_cache(cache_path)
+    if not recalibrate and key in cache and cache[key]['backend'] in BACKENDS:
+        return cache[key]['backend']
+
+    timings = calibrate(builder, integrator=integrator)
+    if not timings:
+        print("No physics backend ran the scene during calibration, using 'numpy'")
+        return 'numpy' #(not cached, so the next start calibrates again)
+    best = min(timings, key=timings.get)
+    cache[key] = {'backend': best, 'timings': timings, 'fingerprint': machine_fingerprint()}
+    try:
+        if not os.path.isdir(os.path.dirname(cache_path)):
+            os.makedirs(os.path.dirname(cache_path))
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except (IOError, OSError):
+        pass #the choice is still used, it just gets calibrated again next time
+    return best
@@ -0,0 +1,194 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Barnes-Hut tree code version of the gravity engine.
+# The octree is stored as flat numpy arrays (one entry per node) built from the morton ordering of the points,
+# and it is walked for all targets at once so the force computation scales as O(N log N) instead of O(N^2).
+#--------------------------------#
+
+import numpy as np
+
+from .gravity_vectorized import newtonianLawOfGravitation
+
+MAX_DEPTH = 20 #levels of the octree (3 bits per level so the morton codes fit in 64 bits)
+
+def _part1by2(x):
+    #spread the lower 21 bits of x so there are two zero bits between each of them
+    x = x & np.uint64(0x1fffff)
+    x = (x | x << np.uint64(32)) & np.uint64(0x1f00000000ffff)
+    x = (x | x << np.uint64(16)) & np.uint64(0x1f0000ff0000ff)
+    x = (x | x << np.uint64(8)) & np.uint64(0x100f00f00f00f00f)
+    x = (x | x << np.uint64(4)) & np.uint64(0x10c30c30c30c30c3)
+    x = (x | x << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return x
+
+def _segment_offsets(counts):
+    #for segments of the given lengths return (segment index, offset within the segment) for every element of every segment
+    seg = np.repeat(np.arange(counts.shape[0]), counts)
+    offsets = np.arange(seg.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+    return seg, offsets
+
+class Octree():
+    #An octree over a set of point masses where every node property is a numpy array indexed by node id.
+    #Node 0 is the root, the children of a node are stored contiguously (child_start, child_count)
+    #and every node covers the contiguous range [start, start+count) of the morton sorted points.
+
+    def __init__(self, coord, mass, radius=None, leaf_size=8, max_depth=MAX_DEPTH):
+        self.max_depth = max_depth
+        self.lo = coord.min(axis=0)
+        self.size = (coord.max(axis=0) - self.lo).max() * (1 + 1e-9)
+        if not self.size > 0:
+            self.size = 1.0
+
+        self.codes = self.morton_codes(coord)
+        self.order = np.argsort(self.codes, kind='stable')
+        self.codes = self.codes[self.order]
+        self.coord = coord[self.order]
+        self.mass = mass[self.order].astype(np.float64) #(mass weighted sums overflow float32)
+        self.radius = None if radius is None else radius[self.order]
+
+        self._build(leaf_size)
+
+    def morton_codes(self, coord):
+        cells = 2 ** self.max_depth
+        ijk = np.floor((coord - self.lo) / self.size * cells)
+        ijk = np.clip(ijk, 0, cells - 1).astype(np.uint64)
+        return _part1by2(ijk[:, 0]) | (_part1by2(ijk[:, 1]) << np.uint64(1)) | (_part1by2(ijk[:, 2]) << np.uint64(2))
+
+    def _build(self, leaf_size):
+        n = self.codes.shape[0]
+        weighted = self.coord * self.mass[:, None]
+
+        levels = []
+        seg_is_node = np.ones(1, dtype=bool) #at level 0 there is a single segment (the root) and it is a node
+        for level in range(self.max_depth + 1):
+            prefix = self.codes >> np.uint64(3 * (self.max_depth - level))
+            starts = np.flatnonzero(np.r_[True, prefix[1:] != prefix[:-1]])
+            if level > 0:
+                parent = np.searchsorted(levels[-1]['seg_starts'], starts, side='right') - 1
+                seg_is_node = levels[-1]['seg_split'][parent]
+
+            counts = np.diff(np.r_[starts, n])
+            seg_split = seg_is_node & (counts > leaf_size) & (level < self.max_depth)
+            levels.append(dict(seg_starts=starts, seg_split=seg_split, seg_is_node=seg_is_node, seg_counts=counts,
+                               seg_prefix=prefix[starts]))
+            if not seg_split.any():
+                break
+
+        start, count, prefix, level_of, node_mass, com, max_radius, split = [], [], [], [], [], [], [], []
+        for level, lv in enumerate(levels):
+            is_node = lv['seg_is_node']
+            seg_mass = np.add.reduceat(self.mass, lv['seg_starts'])
+            seg_weighted = np.add.reduceat(weighted, lv['seg_starts'], axis=0)
+            m = seg_mass[is_node]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                c = seg_weighted[is_node] / m[:, None]
+            massless = m == 0 #a node of massless points is centred on its first point (it pulls on nothing anyway)
+            c[massless] = self.coord[lv['seg_starts'][is_node][massless]]
+
+            start.append(lv['seg_starts'][is_node])
+            count.append(lv['seg_counts'][is_node])
+            prefix.append(lv['seg_prefix'][is_node])
+            level_of.append(np.full(m.shape[0], level))
+            node_mass.append(m)
+            com.append(c)
+            split.append(lv['seg_split'][is_node])
+            if self.radius is not None:
+                max_radius.append(np.maximum.reduceat(self.radius, lv['seg_starts'])[is_node])
+
+        self.start = np.concatenate(start)
+        self.count = np.concatenate(count)
+        self.prefix = np.concatenate(prefix)
+        self.level = np.concatenate(level_of)
+        self.node_mass = np.concatenate(node_mass)
+        self.com = np.concatenate(com)
+        self.width = self.size / 2.0 ** self.level
+        self.leaf = ~np.concatenate(split)
+        self.max_radius = np.concatenate(max_radius) if self.radius is not None else np.zeros_like(self.width)
+
+        #link every split node to its (contiguous) children on the next level
+        self.child_start = np.zeros_like(self.start)
+        self.child_count = np.zeros_like(self.count)
+        for level in range(len(levels) - 1):
+            parents = np.flatnonzero((self.level == level) & ~self.leaf)
+            children = np.flatnonzero(self.level == level + 1)
+            self.child_start[parents] = children[np.searchsorted(self.start[children], self.start[parents])]
+            self.child_count[parents] = np.diff(np.r_[self.child_start[parents], children[-1] + 1]) if parents.shape[0] else 0
+
+    def accelerations(self, target_coord, opening_angle, G, target_radius=None, block=4096):
+        #Walk the tree for every target at once (in blocks of targets) and return the gforce on each target,
+        #plus a boolean mask of the targets that are not touching any of the tree's points (when radii are given).
+        accel = np.zeros((target_coord.shape[0], 3))
+        uncollided = np.ones(target_coord.shape[0], dtype=bool)
+        target_codes = self.morton_codes(target_coord)
+        theta2 = opening_angle ** 2
+
+        for b in range(0, target_coord.shape[0], block):
+            tgt = np.arange(b, min(b + block, target_coord.shape[0]))
+            node = np.zeros_like(tgt)
+            rows = accel[b:b + block] #(the block's gforce is summed in its own rows, not bincounted over every target)
+
+            while tgt.shape[0]:
+                slope = self.com[node] - target_coord[tgt]
+                space = np.einsum('ij,ij->i', slope, slope)
+                width = self.width[node]
+
+                #a node must be opened if it is too close for its size, if the target lies inside it,
+                #or (when testing collisions) if any of its points could be touching the target
+                opened = width * width > theta2 * space
+                opened |= (target_codes[tgt] >> np.uint64(3) * (self.max_depth - self.level[node]).astype(np.uint64)) == self.prefix[node]
+                if target_radius is not None:
+                    reach = width * np.sqrt(3) + self.max_radius[node] + target_radius[tgt]
+                    opened |= space <= reach * reach
+
+                far = ~opened
+                self._add_gforce(rows, b, tgt[far], slope[far], space[far], self.node_mass[node[far]], G)
+
+                near_leaf = opened & self.leaf[node]
+                if near_leaf.any():
+                    self._leaf_direct(rows, b, uncollided, target_coord, target_radius, tgt[near_leaf], node[near_leaf], G)
+
+                inner = opened & ~self.leaf[node]
+                seg, offsets = _segment_offsets(self.child_count[node[inner]])
+                tgt = tgt[inner][seg]
+                node = self.child_start[node[inner]][seg] + offsets
+
+        return accel, uncollided
+
+    def _leaf_direct(self, accel, first, uncollided, target_coord, target_radius, tgt, node, G):
+        seg, offsets = _segment_offsets(self.count[node])
+        tgt = tgt[seg]
+        src = self.start[node][seg] + offsets
+
+        slope = self.coord[src] - target_coord[tgt]
+        space = np.einsum('ij,ij->i', slope, slope)
+        if target_radius is not None:
+            reach = self.radius[src] + target_radius[tgt]
+            uncollided[tgt[space <= reach * reach]] = False
+
+        keep = space > 0 #no force from a point onto itself
+        self._add_gforce(accel, first, tgt[keep], slope[keep], space[keep], self.mass[src[keep]], G)
+
+    @staticmethod
+    def _add_gforce(accel, first, tgt, slope, space, mass, G):
+        #accel holds the rows of the targets from the first one on
+        if tgt.shape[0] == 0:
+            return
+        inv_hyp = 1 / np.sqrt(space)
+        mat_g = G * mass * inv_hyp * inv_hyp * inv_hyp
+        for ax in range(3):
+            accel[:, ax] += np.bincount(tgt - first, slope[:, ax] * mat_g, accel.shape[0])
+
+
+class barnesHutGravitation(newtonianLawOfGravitation):
+    #Same engine as newtonianLawOfGravitation but the bodies and particles get their gforce from a Barnes-Hut octree.
+    opening_angle = 0.5 #nodes smaller than opening_angle times their distance are treated as a single point mass
+    leaf_size = 16 #max number of bodies in a leaf of the octree
+
+    def _body_accelerations(self, coord):
+        tree = Octree(coord, self.verts_mass, leaf_size=self.leaf_size)
+        return tree.accelerations(coord, self.opening_angle, self.G)[0]
+
+    def _particle_accelerations(self, coord):
+        tree = Octree(self.verts_coord, self.verts_mass, radius=self.verts_radius, leaf_size=self.leaf_size)
+        return tree.accelerations(coord, self.opening_angle, self.G, target_radius=self.parts_radius)
@@ -0,0 +1,91 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Broad phase collision detection between the particles and the bodies with a spatial hash.
+# The bodies are few and the particles many, so only the bodies go into the hash: every body is filed under each
+# grid cell its reach (its radius plus the largest particle radius) overlaps, with the cells sized to the largest reach.
+# A particle then only looks up its own cell and is distance checked against the bodies filed there,
+# which is almost always none of them.
+# Bodies overlapping each other are found by sort and sweep along one axis (see overlapping_pairs).
+#--------------------------------#
+
+import numpy as np
+
+MAX_CELLS = 2 ** 20 #cells per axis at most (so the cell keys fit in an int64)
+
+class SpatialHash():
+    def __init__(self, coord, radius, max_particle_radius=0.):
+        self.coord = coord
+        self.radius = radius
+        self.max_particle_radius = max_particle_radius
+        reach = radius + max_particle_radius
+
+        #only the box around the bodies' reach is gridded, anything outside it cannot touch a body
+        self.lo = (coord - reach[:, None]).min(axis=0)
+        self.hi = (coord + reach[:, None]).max(axis=0)
+        self.size = max(2 * reach.max(), (self.hi - self.lo).max() / (MAX_CELLS - 1), 1e-30)
+        self.dims = np.floor((self.hi - self.lo) / self.size).astype(np.int64) + 1
+
+        #with cells at least as wide as any reach a body overlaps at most two cells along each axis
+        first = np.floor((coord - reach[:, None] - self.lo) / self.size).astype(np.int64)
+        last = np.floor((coord + reach[:, None] - self.lo) / self.size).astype(np.int64)
+        keys, bodies = [], []
+        for corner in np.ndindex(2, 2, 2):
+            ijk = np.minimum(first + corner, last)
+            keys.append(self._keys(ijk))
+            bodies.append(np.arange(coord.shape[0]))
+        pairs = np.unique(np.stack([np.concatenate(keys), np.concatenate(bodies)], axis=1), axis=0) #(sorted by cell key)
+        self.keys, self.bodies = pairs[:, 0], pairs[:, 1]
+
+    def _keys(self, ijk):
+        return (ijk[:, 0] * self.dims[1] + ijk[:, 1]) * self.dims[2] + ijk[:, 2]
+
+    def candidates(self, points):
+        #The (point row, body) pairs that share a cell, the broad phase.
+        inside = np.flatnonzero(np.all((points >= self.lo) & (points <= self.hi), axis=1))
+        ijk = np.floor((points[inside] - self.lo) / self.size).astype(np.int64)
+        ijk = np.minimum(ijk, self.dims - 1)
+        keys = self._keys(ijk)
+        start = np.searchsorted(self.keys, keys, side='left')
+        count = np.searchsorted(self.keys, keys, side='right') - start
+        rows = np.repeat(inside, count)
+        offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        return rows, self.bodies[np.repeat(start, count) + offsets]
+
+    def collisions(self, points, radius):
+        #The (point row, body) pairs that touch, the narrow phase distance check on the broad phase's candidates.
+        rows, bodies = self.candidates(points)
+        slope = self.coord[bodies] - points[rows]
+        reach = self.radius[bodies] + radius[rows]
+        touching = np.einsum('ij,ij->i', slope, slope) <= reach * reach
+        return rows[touching], bodies[touching]
+
+def find_collisions(points, radius, body_coord, body_radius):
+    #The (point row, body) pairs touching each other (a point touching several bodies is listed with each of them).
+    if points.shape[0] == 0 or body_coord.shape[0] == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return SpatialHash(body_coord, body_radius, radius.max()).collisions(points, radius)
+
+def nearest_bodies(points, radius, body_coord, body_radius):
+    #The body whose surface is closest to each point (the one a particle that was just found colliding hit).
+    slope = body_coord[None, :, :] - points[:, None, :]
+    gap = np.sqrt(np.einsum('ijk,ijk->ij', slope, slope)) - body_radius[None, :] - radius[:, None]
+    return np.argmin(gap, axis=1)
+
+def overlapping_pairs(coord, radius):
+    #The (i, j) pairs (i < j) of spheres that overlap, by sort and sweep: sorted by where they start along x,
+    #a sphere can only overlap the ones after it that start before it ends there, and only those get the distance check.
+    n = coord.shape[0]
+    lo = coord[:, 0] - radius
+    order = np.argsort(lo, kind='stable')
+    end = np.searchsorted(lo[order], (coord[:, 0] + radius)[order], side='right')
+    count = np.maximum(end - np.arange(n) - 1, 0)
+    a = np.repeat(np.arange(n), count)
+    b = a + 1 + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    i, j = order[a], order[b]
+
+    slope = coord[j] - coord[i]
+    reach = radius[i] + radius[j]
+    touching = np.einsum('ij,ij->i', slope, slope) <= reach * reach
+    i, j = i[touching], j[touching]
+    return np.minimum(i, j), np.maximum(i, j)
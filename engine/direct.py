@@ -0,0 +1,120 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Direct summation kernels, every target against every source in memory capped blocks.
+# Used by the engine itself and by the backends and integrators that need the exact pull on some of the points.
+#--------------------------------#
+
+import numpy as np
+
+from .workspace import scratch
+
+def direct_accelerations(target_coord, source_coord, source_mass, G, target_radius=None, source_radius=None, memory_cap=4 * 2 ** 20,
+                         workspace=None):
+    #Direct sum of the gforce G*m*r_vec/|r|^3 that every source puts on every target.
+    #Targets are processed in blocks so the blocks' temporaries never exceed memory_cap bytes (no P*N sized arrays),
+    #and a source sitting exactly on top of a target is skipped so a body may be passed as both.
+    #When the radii are given the collision test is done in the same pass and a boolean mask of the
+    #targets that are not touching any source is returned alongside the accelerations.
+    #With a workspace (see workspace.py) the blocks' temporaries are its buffers, reused from one call to the next.
+    n_targets = target_coord.shape[0]
+    n_sources = source_coord.shape[0]
+    accel = np.zeros((n_targets, 3), dtype=target_coord.dtype)
+    uncollided = np.ones(n_targets, dtype=bool)
+    if n_sources == 0:
+        return accel, uncollided
+
+    force = G * source_mass
+    block = max(1, int(memory_cap // (n_sources * target_coord.itemsize * 8))) #about 8 floats of temporaries for each target/source pair
+    block = max(1, min(block, n_targets))
+    get = scratch(workspace)
+    slope_block = get('direct_slope', (block, n_sources, 3), target_coord.dtype)
+    space_block = get('direct_space', (block, n_sources), target_coord.dtype)
+    inv_block = get('direct_inv_hyp', (block, n_sources), target_coord.dtype)
+    mask_block = get('direct_mask', (block, n_sources), bool)
+
+    for start in range(0, n_targets, block):
+        end = min(start + block, n_targets)
+        slope, space, inv_hyp, mask = slope_block[:end - start], space_block[:end - start], inv_block[:end - start], mask_block[:end - start]
+        np.subtract(source_coord[None, :, :], target_coord[start:end, None, :], out=slope) # delta positions pointing from the target towards the source
+        np.einsum('ijk,ijk->ij', slope, slope, out=space) # squared distances
+
+        if target_radius is not None:
+            reach = np.add(source_radius[None, :], target_radius[start:end, None], out=inv_hyp)
+            np.multiply(reach, reach, out=reach)
+            np.greater(space, reach, out=mask)
+            np.all(mask, axis=1, out=uncollided[start:end])
+
+        with np.errstate(divide='ignore'):
+            np.sqrt(space, out=inv_hyp)
+            np.divide(1, inv_hyp, out=inv_hyp)
+        np.equal(space, 0, out=mask)
+        np.copyto(inv_hyp, 0, where=mask) #no force from a source onto itself
+        mat_g = np.multiply(force, inv_hyp, out=space) #(the squared distances are not needed any more)
+        mat_g *= inv_hyp
+        mat_g *= inv_hyp
+        np.einsum('ij,ijk->ik', mat_g, slope, out=accel[start:end])
+
+    return accel, uncollided
+
+def direct_accelerations_and_jerks(target_coord, target_vel, source_coord, source_vel, source_mass, G,
+                                   target_radius=None, source_radius=None, memory_cap=4 * 2 ** 20, workspace=None):
+    #The gforce and its time derivative (the jerk) G*m*(v_vec/|r|^3 - 3*(r.v)*r_vec/|r|^5) every source puts on every target,
+    #both from the same deltas in one pass. Blocked, self skipping, collision tested and using the workspace the same way as direct_accelerations.
+    n_targets = target_coord.shape[0]
+    n_sources = source_coord.shape[0]
+    accel = np.zeros((n_targets, 3), dtype=target_coord.dtype)
+    jerk = np.zeros((n_targets, 3), dtype=target_coord.dtype)
+    uncollided = np.ones(n_targets, dtype=bool)
+    if n_sources == 0:
+        return accel, jerk, uncollided
+
+    force = G * source_mass
+    block = max(1, int(memory_cap // (n_sources * target_coord.itemsize * 12)))
+    block = max(1, min(block, n_targets))
+    get = scratch(workspace)
+    slope_block = get('jerk_slope', (block, n_sources, 3), target_coord.dtype)
+    dvel_block = get('jerk_dvel', (block, n_sources, 3), target_coord.dtype)
+    space_block = get('jerk_space', (block, n_sources), target_coord.dtype)
+    inv_block = get('jerk_inv_hyp', (block, n_sources), target_coord.dtype)
+    rv_block = get('jerk_rv', (block, n_sources), target_coord.dtype)
+    mask_block = get('jerk_mask', (block, n_sources), bool)
+    rows_block = get('jerk_rows', (block, 3), target_coord.dtype)
+
+    for start in range(0, n_targets, block):
+        end = min(start + block, n_targets)
+        k = end - start
+        slope, dvel, space, inv_hyp, rv, mask = slope_block[:k], dvel_block[:k], space_block[:k], inv_block[:k], rv_block[:k], mask_block[:k]
+        np.subtract(source_coord[None, :, :], target_coord[start:end, None, :], out=slope)
+        np.subtract(source_vel[None, :, :], target_vel[start:end, None, :], out=dvel)
+        np.einsum('ijk,ijk->ij', slope, slope, out=space)
+
+        if target_radius is not None:
+            reach = np.add(source_radius[None, :], target_radius[start:end, None], out=inv_hyp)
+            np.multiply(reach, reach, out=reach)
+            np.greater(space, reach, out=mask)
+            np.all(mask, axis=1, out=uncollided[start:end])
+
+        with np.errstate(divide='ignore'):
+            np.sqrt(space, out=inv_hyp)
+            np.divide(1, inv_hyp, out=inv_hyp)
+        np.equal(space, 0, out=mask)
+        np.copyto(inv_hyp, 0, where=mask) #no force from a source onto itself
+        np.einsum('ijk,ijk->ij', slope, dvel, out=rv)
+        rv *= inv_hyp
+        rv *= inv_hyp
+        rv *= 3
+        inv_hyp3 = np.multiply(force, inv_hyp, out=space) #(the squared distances are not needed any more)
+        inv_hyp3 *= inv_hyp
+        inv_hyp3 *= inv_hyp
+        np.einsum('ij,ijk->ik', inv_hyp3, slope, out=accel[start:end])
+        np.einsum('ij,ijk->ik', inv_hyp3, dvel, out=jerk[start:end])
+        rv *= inv_hyp3
+        jerk[start:end] -= np.einsum('ij,ijk->ik', rv, slope, out=rows_block[:k])
+
+    return accel, jerk, uncollided
+
+def direct_jerks(target_coord, target_vel, source_coord, source_vel, source_mass, G, memory_cap=4 * 2 ** 20, workspace=None):
+    #Only the jerk of direct_accelerations_and_jerks.
+    return direct_accelerations_and_jerks(target_coord, target_vel, source_coord, source_vel, source_mass, G,
+                                          memory_cap=memory_cap, workspace=workspace)[1]
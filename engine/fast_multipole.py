@@ -0,0 +1,271 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Fast multipole method version of the gravity engine.
+# Cartesian (Taylor series) multipole and local expansions of configurable order on a uniform octree.
+# Far away cells only interact through their expansions and only neighbouring cells are summed directly,
+# so the cost approaches O(N) and the error is controlled by the expansion order.
+#--------------------------------#
+
+from math import factorial
+from itertools import product
+
+import numpy as np
+
+from .gravity_vectorized import newtonianLawOfGravitation
+from .barnes_hut import _segment_offsets
+
+MIN_LEVEL = 2 #the first level with well separated cells
+MAX_LEVEL = 10
+
+def _multi_indices(order):
+    #every (a, b, c) with a+b+c <= order sorted by total order, and a lookup table from (a, b, c) to its position
+    idx = sorted((s, c) for s in range(order + 1) for c in product(range(s + 1), repeat=3) if sum(c) == s)
+    idx = np.array([c for s, c in idx], dtype=int).reshape(-1, 3)
+    lookup = -np.ones((order + 3,) * 3, dtype=int)
+    lookup[idx[:, 0], idx[:, 1], idx[:, 2]] = np.arange(idx.shape[0])
+    return idx, lookup
+
+def _powers(d, idx):
+    #d**k for every multi-index k (rows are the vectors in d)
+    p = idx.max()
+    pw = d[:, None, :] ** np.arange(p + 1)[None, :, None]
+    return pw[:, idx[:, 0], 0] * pw[:, idx[:, 1], 1] * pw[:, idx[:, 2], 2]
+
+def _binomial(n, k):
+    #product of the binomial coefficients of the multi-indices n and k (0 where k > n)
+    out = np.ones(np.broadcast(n[..., 0], k[..., 0]).shape)
+    for ax in range(3):
+        ok = k[..., ax] <= n[..., ax]
+        b = np.array([factorial(a) for a in range(int(n.max()) + 1)], dtype=float)
+        nn, kk = n[..., ax], np.minimum(k[..., ax], n[..., ax])
+        out = out * np.where(ok, b[nn] / (b[kk] * b[nn - kk]), 0)
+    return out
+
+def _derivatives(R, idx, lookup):
+    #a_m = (1/m!) d^m/dy^m 1/|x-y| for every multi-index m, where R = x - y
+    #uses the recurrence |m| r^2 a_m = (2|m|-1) sum_i R_i a_{m-e_i} - (|m|-1) sum_i a_{m-2e_i}
+    space = np.einsum('ij,ij->i', R, R)
+    a = np.zeros((R.shape[0], idx.shape[0]))
+    a[:, 0] = 1 / np.sqrt(space)
+    for m in range(1, idx.shape[0]):
+        s = idx[m].sum()
+        acc = np.zeros(R.shape[0])
+        for ax in range(3):
+            if idx[m, ax] >= 1:
+                e = idx[m].copy()
+                e[ax] -= 1
+                acc += (2 * s - 1) * R[:, ax] * a[:, lookup[tuple(e)]]
+            if idx[m, ax] >= 2:
+                e = idx[m].copy()
+                e[ax] -= 2
+                acc -= (s - 1) * a[:, lookup[tuple(e)]]
+        a[:, m] = acc / (s * space)
+    return a
+
+class _Operators():
+    #The translation operators for one expansion order (they only depend on the cell layout, not on the points).
+
+    def __init__(self, order):
+        self.order = order
+        self.idx, self.lookup = _multi_indices(order)
+        self.idx2, self.lookup2 = _multi_indices(2 * order)
+        n, k = self.idx[:, None, :], self.idx[None, :, :]
+        self.shift_binomial = _binomial(n, k) #C(n, k) for the M2M and L2L shifts
+        self.shift_powers = np.maximum(n - k, 0)
+        self.m2l_binomial = _binomial(n + k, n) * (-1.0) ** n.sum(axis=2) #(-1)^|n| C(n+k, n)
+        self.m2l_index = self.lookup2[tuple(np.moveaxis(n + k, -1, 0))]
+        self.octants = np.array(list(product((0, 1), repeat=3)))
+        far = [o for o in product(range(-3, 4), repeat=3) if max(abs(c) for c in o) >= 2]
+        self.far_offsets = np.array(far)
+        self.near_offsets = np.array(list(product((-1, 0, 1), repeat=3)))
+        self._m2l = {}
+
+    def shift(self, d):
+        #B[n, k] = C(n, k) d^(n-k), the shifted multipole is M @ B.T and the shifted local expansion is L @ B
+        pw = np.prod(d[None, None, :] ** self.shift_powers, axis=2)
+        return self.shift_binomial * pw
+
+    def m2l(self, width):
+        #T[n, k] for every well separated offset (in units of the cell width), the local expansion is M @ T.T
+        if width not in self._m2l:
+            a = _derivatives(-self.far_offsets * width, self.idx2, self.lookup2)
+            self._m2l[width] = self.m2l_binomial[None] * a[:, self.m2l_index]
+        return self._m2l[width]
+
+_operators = {}
+
+def _get_operators(order):
+    if order not in _operators:
+        _operators[order] = _Operators(order)
+    return _operators[order]
+
+def _cell_keys(ijk, level):
+    return (ijk[:, 0] << (2 * level)) | (ijk[:, 1] << level) | ijk[:, 2]
+
+def _lookup(keys, wanted):
+    #position of each wanted key in the sorted keys array, -1 where it is missing
+    pos = np.searchsorted(keys, wanted).clip(0, max(keys.shape[0] - 1, 0))
+    found = keys.shape[0] > 0
+    return np.where(found & (keys[pos] == wanted), pos, -1) if found else -np.ones_like(wanted)
+
+def fmm_accelerations(target_coord, source_coord, source_mass, G, order=4, leaf_size=32,
+                      target_radius=None, source_radius=None, block=4096, far=None):
+    #The gforce every source puts on every target (a source exactly on top of a target is skipped),
+    #plus a boolean mask of the targets that are not touching any source when the radii are given.
+    #Targets that are not finite or sit at far or beyond (removed particles put out of sight) get no gforce,
+    #they are left out of the cube so they do not squeeze every other point into one leaf cell.
+    ops = _get_operators(order)
+    n_targets = target_coord.shape[0]
+    accel = np.zeros((n_targets, 3))
+    uncollided = np.ones(n_targets, dtype=bool)
+    if n_targets == 0 or source_coord.shape[0] == 0:
+        return accel, uncollided
+    live = np.isfinite(target_coord).all(axis=1)
+    if far is not None:
+        live &= np.abs(target_coord).max(axis=1) < far
+    if not live.all():
+        rows = np.flatnonzero(live)
+        accel[rows], uncollided[rows] = fmm_accelerations(target_coord[rows], source_coord, source_mass, G, order, leaf_size,
+                                                          None if target_radius is None else target_radius[rows], source_radius, block)
+        return accel, uncollided
+
+    #work in a unit cube so the high order terms stay well inside floating point range
+    lo = np.minimum(target_coord.min(axis=0), source_coord.min(axis=0))
+    size = (np.maximum(target_coord.max(axis=0), source_coord.max(axis=0)) - lo).max() * (1 + 1e-9)
+    if not size > 0:
+        size = 1.0
+    tgt = (target_coord - lo) / size
+    src = (source_coord - lo) / size
+
+    leaf = int(np.clip(np.ceil(np.log(max(source_coord.shape[0], n_targets) / leaf_size) / np.log(8)), MIN_LEVEL, MAX_LEVEL))
+    if target_radius is not None:
+        #cells must be at least as wide as the largest possible contact so every collision happens between neighbouring cells
+        reach = (source_radius.max() + target_radius.max()) / size
+        if reach > 0:
+            leaf = int(max(MIN_LEVEL, min(leaf, np.floor(np.log2(1 / reach)))))
+
+    def cells(points, level):
+        ijk = np.clip(np.floor(points * 2 ** level), 0, 2 ** level - 1).astype(np.int64)
+        return _cell_keys(ijk, level), ijk
+
+    def unique_cells(points, level):
+        keys, ijk = cells(points, level)
+        keys, first = np.unique(keys, return_index=True)
+        return keys, ijk[first]
+
+    #sort the points by leaf cell so every leaf cell is a contiguous range
+    src_key, _ = cells(src, leaf)
+    src_order = np.argsort(src_key, kind='stable')
+    src, src_key, mass = src[src_order], src_key[src_order], source_mass[src_order].astype(np.float64) #(the expansions overflow float32)
+    src_keys, src_start, src_count = np.unique(src_key, return_index=True, return_counts=True)
+    src_radius = None if source_radius is None else source_radius[src_order] / size
+
+    #P2M: multipole moments of every source leaf cell
+    src_levels = {leaf: unique_cells(src, leaf)}
+    width = 2.0 ** -leaf
+    centers = (src_levels[leaf][1] + 0.5) * width
+    cell = np.searchsorted(src_keys, src_key)
+    moments = {leaf: np.zeros((src_keys.shape[0], ops.idx.shape[0]))}
+    for b in range(0, src.shape[0], block):
+        c = cell[b:b + block]
+        terms = mass[b:b + block, None] * _powers(src[b:b + block] - centers[c], ops.idx)
+        u, s = np.unique(c, return_index=True)
+        moments[leaf][u] += np.add.reduceat(terms, s, axis=0)
+
+    #M2M: shift the moments of the children up to their parent cells
+    for level in range(leaf - 1, MIN_LEVEL - 1, -1):
+        src_levels[level] = unique_cells(src, level)
+        keys, _ = src_levels[level]
+        child_keys, child_ijk = src_levels[level + 1]
+        parent = np.searchsorted(keys, _cell_keys(child_ijk >> 1, level))
+        moments[level] = np.zeros((keys.shape[0], ops.idx.shape[0]))
+        octant = (child_ijk & 1) @ np.array([4, 2, 1])
+        for o in range(8):
+            sel = octant == o
+            shift = ops.shift((ops.octants[o] - 0.5) * 2.0 ** -(level + 1))
+            moments[level][parent[sel]] += moments[level + 1][sel] @ shift.T
+
+    #M2L and L2L: local expansions of every target cell from the well separated source cells, then passed down to the children
+    locals_ = None
+    for level in range(MIN_LEVEL, leaf + 1):
+        keys, ijk = unique_cells(tgt, level)
+        expansion = np.zeros((keys.shape[0], ops.idx.shape[0]))
+        if locals_ is not None:
+            parent = np.searchsorted(locals_[0], _cell_keys(ijk >> 1, level - 1))
+            octant = (ijk & 1) @ np.array([4, 2, 1])
+            for o in range(8):
+                sel = octant == o
+                shift = ops.shift((ops.octants[o] - 0.5) * 2.0 ** -level)
+                expansion[sel] = locals_[1][parent[sel]] @ shift
+
+        s_keys = src_levels[level][0]
+        m2l = ops.m2l(2.0 ** -level)
+        for o, offset in enumerate(ops.far_offsets):
+            other = ijk + offset
+            ok = np.all((other >= 0) & (other < 2 ** level), axis=1)
+            ok &= np.all(np.abs((other >> 1) - (ijk >> 1)) <= 1, axis=1) #children of the parent's neighbours only
+            if not ok.any():
+                continue
+            s = _lookup(s_keys, _cell_keys(other[ok], level))
+            t = np.flatnonzero(ok)[s >= 0]
+            if t.shape[0]:
+                expansion[t] += moments[level][s[s >= 0]] @ m2l[o].T
+        locals_ = (keys, expansion)
+
+    #L2P: evaluate the gradient of the local expansion at every target
+    t_keys, t_cell_ijk = locals_[0], unique_cells(tgt, leaf)[1]
+    t_key, t_ijk = cells(tgt, leaf)
+    t_cell = np.searchsorted(t_keys, t_key)
+    grad_idx = []
+    for ax in range(3):
+        e = ops.idx.copy()
+        e[:, ax] -= 1
+        has = e[:, ax] >= 0
+        grad_idx.append((has, ops.lookup[tuple(np.moveaxis(np.maximum(e, 0), -1, 0))]))
+    for b in range(0, n_targets, block):
+        d = tgt[b:b + block] - (t_cell_ijk[t_cell[b:b + block]] + 0.5) * width
+        pw = _powers(d, ops.idx)
+        expansion = locals_[1][t_cell[b:b + block]]
+        for ax, (has, lower) in enumerate(grad_idx):
+            accel[b:b + block, ax] = np.einsum('ij,ij->i', expansion[:, has] * ops.idx[has, ax], pw[:, lower[has]])
+
+    #P2P: direct sum with the sources in the neighbouring leaf cells
+    for b in range(0, n_targets, block):
+        rows = np.arange(b, min(b + block, n_targets))
+        near = np.zeros((rows.shape[0], 3)) #(summed per block, a bincount over all the targets for every block would be quadratic)
+        for offset in ops.near_offsets:
+            s = _lookup(src_keys, _cell_keys(np.clip(t_ijk[rows] + offset, 0, 2 ** leaf - 1), leaf))
+            s[np.any((t_ijk[rows] + offset < 0) | (t_ijk[rows] + offset >= 2 ** leaf), axis=1)] = -1
+            r, s = rows[s >= 0], s[s >= 0]
+            seg, offsets = _segment_offsets(src_count[s])
+            r = r[seg]
+            j = src_start[s][seg] + offsets
+
+            slope = src[j] - tgt[r]
+            space = np.einsum('ij,ij->i', slope, slope)
+            if target_radius is not None:
+                reach = src_radius[j] + target_radius[r] / size
+                uncollided[r[space <= reach * reach]] = False
+            keep = space > 0
+            r, slope, space = r[keep], slope[keep], space[keep]
+            inv_hyp = 1 / np.sqrt(space)
+            mat_g = mass[j[keep]] * inv_hyp * inv_hyp * inv_hyp
+            for ax in range(3):
+                near[:, ax] += np.bincount(r - b, slope[:, ax] * mat_g, rows.shape[0])
+        accel[rows] += near
+
+    return accel * (G / size ** 2), uncollided
+
+
+class fastMultipoleGravitation(newtonianLawOfGravitation):
+    #Same engine as newtonianLawOfGravitation but the bodies and particles get their gforce from the fast multipole method.
+    expansion_order = 4 #order of the multipole/local expansions (higher is more accurate and more expensive)
+    leaf_size = 32 #average number of points per leaf cell the octree depth is picked for
+
+    def _body_accelerations(self, coord):
+        return fmm_accelerations(coord, coord, self.verts_mass, self.G, self.expansion_order, self.leaf_size)[0]
+
+    def _particle_accelerations(self, coord):
+        return fmm_accelerations(coord, self.verts_coord, self.verts_mass, self.G, self.expansion_order, self.leaf_size,
+                                 target_radius=self.parts_radius, source_radius=self.verts_radius, far=self.far)
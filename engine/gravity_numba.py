@@ -0,0 +1,153 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Numba compiled version of the gravity engine (optional, needs the numba package).
+# The body and particle steps are the same loops as _update_nonvectorized and _particle_nonvectorized
+# but compiled, run in parallel over all cores with prange and without any of the vectorized versions' temporaries.
+# When numba is not installed numbaGravitation simply runs the numpy code of newtonianLawOfGravitation.
+#--------------------------------#
+
+import numpy as np
+
+from .gravity_vectorized import newtonianLawOfGravitation
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, nogil=True, cache=True)
+    def _body_accelerations(coord, mass, G, accel):
+        n = coord.shape[0]
+        for i in prange(n):
+            g_x, g_y, g_z = 0.0, 0.0, 0.0
+            for j in range(n):
+                d_x = coord[j, 0] - coord[i, 0]
+                d_y = coord[j, 1] - coord[i, 1]
+                d_z = coord[j, 2] - coord[i, 2]
+                space = d_x * d_x + d_y * d_y + d_z * d_z
+                if space == 0.0: #(this is also the body itself)
+                    continue
+                inv_hyp = 1.0 / np.sqrt(space)
+                g = G * mass[j] * inv_hyp * inv_hyp * inv_hyp
+                g_x += g * d_x
+                g_y += g * d_y
+                g_z += g * d_z
+            accel[i, 0] = g_x
+            accel[i, 1] = g_y
+            accel[i, 2] = g_z
+
+    @njit(parallel=True, fastmath=True, nogil=True, cache=True)
+    def _particle_accelerations(parts_coord, parts_radius, verts_coord, verts_mass, verts_radius, G, accel, uncollided):
+        for i in prange(parts_coord.shape[0]):
+            g_x, g_y, g_z = 0.0, 0.0, 0.0
+            alive = True
+            for j in range(verts_coord.shape[0]):
+                d_x = verts_coord[j, 0] - parts_coord[i, 0]
+                d_y = verts_coord[j, 1] - parts_coord[i, 1]
+                d_z = verts_coord[j, 2] - parts_coord[i, 2]
+                space = d_x * d_x + d_y * d_y + d_z * d_z
+                reach = verts_radius[j] + parts_radius[i]
+                if space <= reach * reach:
+                    alive = False
+                if space == 0.0:
+                    continue
+                inv_hyp = 1.0 / np.sqrt(space)
+                g = G * verts_mass[j] * inv_hyp * inv_hyp * inv_hyp
+                g_x += g * d_x
+                g_y += g * d_y
+                g_z += g * d_z
+            accel[i, 0] = g_x
+            accel[i, 1] = g_y
+            accel[i, 2] = g_z
+            uncollided[i] = alive
+
+    @njit(parallel=True, fastmath=True, nogil=True, cache=True)
+    def _kick_drift(coord, vel, accel, t):
+        for i in prange(coord.shape[0]):
+            for ax in range(3):
+                vel[i, ax] += accel[i, ax] * t
+                coord[i, ax] += vel[i, ax] * t
+
+    @njit(parallel=True, fastmath=True, nogil=True, cache=True)
+    def _particle_step(parts_coord, parts_vel, parts_radius, parts_color, verts_coord, verts_mass, verts_radius, G, t, far, hit):
+        #the whole particle step fused into one pass, the gforce is summed, applied and the particle removed if it collided
+        for i in prange(parts_coord.shape[0]):
+            g_x, g_y, g_z = 0.0, 0.0, 0.0
+            hit[i] = -1 #the body it hit, if any
+            for j in range(verts_coord.shape[0]):
+                d_x = verts_coord[j, 0] - parts_coord[i, 0]
+                d_y = verts_coord[j, 1] - parts_coord[i, 1]
+                d_z = verts_coord[j, 2] - parts_coord[i, 2]
+                space = d_x * d_x + d_y * d_y + d_z * d_z
+                reach = verts_radius[j] + parts_radius[i]
+                if space <= reach * reach:
+                    hit[i] = j
+                if space == 0.0:
+                    continue
+                inv_hyp = 1.0 / np.sqrt(space)
+                g = G * verts_mass[j] * inv_hyp * inv_hyp * inv_hyp
+                g_x += g * d_x
+                g_y += g * d_y
+                g_z += g * d_z
+
+            parts_vel[i, 0] += g_x * t
+            parts_vel[i, 1] += g_y * t
+            parts_vel[i, 2] += g_z * t
+            for ax in range(3):
+                parts_coord[i, ax] += parts_vel[i, ax] * t
+
+            if hit[i] >= 0:
+                for ax in range(3):
+                    parts_coord[i, ax] = far #put them very far away and out of sight!
+                    parts_vel[i, ax] = 0.0
+                for c in range(parts_color.shape[1]):
+                    parts_color[i, c] = 0.0
+                parts_radius[i] = 0.0
+
+
+class numbaGravitation(newtonianLawOfGravitation):
+    #Same engine as newtonianLawOfGravitation but the direct sums are compiled loops (falls back to numpy without numba).
+    available = njit is not None
+
+    def _update_vectorized(self, t):
+        if not self.available:
+            return super(numbaGravitation, self)._update_vectorized(t)
+
+        accel = self.workspace.get('numba_accel', self.verts_coord.shape, self.verts_coord.dtype) #(used up by the kick, unlike _body_accelerations' result)
+        _body_accelerations(self.verts_coord, self.verts_mass, self.G, accel)
+        _kick_drift(self.verts_coord, self.verts_vel, accel, t)
+        return self.verts_coord
+
+    def _particle_vectorized(self, t):
+        if not self.available or self.parts_mass is not None or self._integrated is not None: #(particles with mass also need the self gravity pass, and particles on Kepler orbits are skipped)
+            return super(numbaGravitation, self)._particle_vectorized(t)
+
+        hit = self.workspace.get('numba_hit', (self.parts_coord.shape[0],), np.int64)
+        _particle_step(self.parts_coord, self.parts_vel, self.parts_radius, self.parts_color,
+                       self.verts_coord, self.verts_mass, self.verts_radius, self.G, t, self.far, hit)
+        collided = np.flatnonzero(hit >= 0)
+        if collided.shape[0]: #(the kernel already cleared them, they are only logged and their rows freed)
+            self._record_collisions(collided, hit[collided])
+            self._parts_pool.kill(collided)
+        return self.parts_coord
+
+    def _body_accelerations(self, coord):
+        if not self.available:
+            return super(numbaGravitation, self)._body_accelerations(coord)
+
+        accel = np.empty_like(coord)
+        _body_accelerations(coord, self.verts_mass, self.G, accel)
+        return accel
+
+    def _particle_accelerations(self, coord):
+        if not self.available:
+            return super(numbaGravitation, self)._particle_accelerations(coord)
+
+        accel = np.empty_like(coord)
+        uncollided = np.empty(coord.shape[0], dtype=bool)
+        _particle_accelerations(coord, self.parts_radius, self.verts_coord, self.verts_mass, self.verts_radius, self.G,
+                                accel, uncollided)
+        return accel, uncollided
@@ -6,8 +6,18 @@
 #--------------------------------#
 
 import time
+import tracemalloc
 import numpy as np
 
+from .direct import direct_accelerations, direct_accelerations_and_jerks, direct_jerks
+from .particle_mesh import ParticleMesh
+from .particle_pool import ParticlePool
+from .workspace import Workspace
+from .collisions import find_collisions, nearest_bodies, overlapping_pairs
+from .integrators import get_integrator, integrate
+from .kepler import kepler_drift
+from .accel_grid import AccelerationGrids
+
 class newtonianLawOfGravitation():
     builder = None #the builder object for the scene actor
 
@@ -18,38 +28,177 @@ class newtonianLawOfGravitation():
     parts_coord = None #particle coordinates
     parts_color = None
     parts_radius = None
+    parts_mass = None #only set when the builder gives the particles a mass (then they also pull on each other and on the bodies)
+    parts_id = None #every particle's id, it keeps it when its row changes
+
+    collision_detection = 'direct' #'direct' tests every particle against every body, 'spatial_hash' only those sharing a grid cell (see collisions.py, for the numpy kernels)
+    collision_events = None #(particle id, body index, time) for every particle that hit a body during the last update()
+
+    merge_bodies = False #bodies that touch merge into one, keeping their total mass and momentum (a builder can turn it on with its own merge_bodies)
+    merge_events = None #(body, absorbed body, time) for every merger during the last update() (as numbered before it)
+    verts_remap = None #old body row -> new row (-1 for absorbed bodies) of the last merger
+
+    kepler_particles = False #massless particles dominated by one body (like rings) follow exact Kepler orbits around it instead of being integrated (euler and the composition integrators, numpy kernels)
+    kepler_threshold = 1e-3 #a particle is integrated from then on once the other bodies' tidal pull on it exceeds this fraction of its host's pull
+    parts_host = None #the body each particle orbits analytically, -1 for the integrated ones (only with kepler_particles)
+    _integrated = None #rows of the particles integrated this step while the others are on Kepler orbits
+
+    particle_grids = False #massless particles near a body read the other bodies' pull from a coarse grid it carries (see accel_grid.py, numpy kernels)
+    grid_size = 8 #nodes per axis of each body's grid
+    grid_reach = 0.5 #how far a body's grid reaches towards the nearest other body's surface (as a fraction of the gap, at most 0.5)
+    grid_every = 50 #most steps between rebuilds of the grids (they are rebuilt sooner once the bodies moved a grid cell relative to each other, or merged)
+    _grids = None
+    _grid_hosts = None #each particle's grid at the last lookup (and the parts_generation it is for), where the next one looks first
+
+    parts_capacity = None #rows in the particle pool, None starts it at the scene's particle count (it grows when spawning needs more)
+    compact_fraction = 0.1 #compact the particle pool once this fraction of its rows are dead
+    parts_remap = None #old row -> new row (-1 for removed particles) of the last compaction, for renderers keeping per particle data
+    parts_generation = 0 #counts the changes to the rows drawn (particle compactions and spawns, body mergers and reloads)
+    _parts_pool = None #the particles' storage (see particle_pool.py), the parts_ arrays are views of its live rows
 
     sess = None
 
+    _pairs = None #cached body pair layout (see _body_pairs)
+    _forces = None #accelerations at the current positions left over from the last integrator step
+
+    integrator = 'euler' #'euler', 'leapfrog', 'yoshida4', 'yoshida6', 'block', 'wisdom_holman' or 'hermite' (see integrators.py)
+
+    block_levels = 10 #the block integrator's deepest level, its smallest step is the frame's step / 2**block_levels
+    block_eta = 0.02 #the block integrator's accuracy, each step is at most block_eta * |accel| / |jerk|
+    block_particle_levels = 0 #the particles' deepest level (0 steps them with the frame's step, as leapfrog), every level deeper can double their force evaluations
+    _block = None #the block integrator's per body and particle levels and accelerations
+
+    hermite_eta = 0.02 #the hermite integrator's accuracy parameter for Aarseth's time step criterion
+    hermite_max_substeps = 1024 #the hermite integrator never steps less than the frame's step / hermite_max_substeps
+    _hermite = None #the hermite integrator's accelerations, jerks and next step size
+
     size_scale = 1 * 10 ** 8 #defaults to 1 million kilometers per unit
     time_scale = 1 #defaults to 1 but can be adjusted with slider control
 
+    physics_step = None #seconds of simulated time per physics step, None takes one step of the whole frame's time per frame
+    max_substeps = 64 #most physics steps per frame (the simulation falls behind the time scale rather than the frame rate)
+    substeps = 0 #physics steps taken by the last update()
+
     G = 6.674 * 10 ** -11  # Newton meters^2/kg^2
 
-    def __init__(self, builder):
+    dtype = np.float64 #np.float32 runs the physics in single precision with the coordinates kept relative to a floating origin
+    origin_body = None #the body the floating origin follows, None follows the center of mass of the bodies
+    rebase_every = 50 #updates between moves of the floating origin (only with float32)
+    origin = None #world position in meters (float64) of the engine coordinates' zero
+
+    workspace = None #scratch buffers reused by every step (see workspace.py), they are only allocated again when the body or particle counts grow
+    debug_workspace = False #assert that an update() allocates no workspace buffers unless the body or particle counts changed since the last one
+    debug_allocations = False #trace every update() with tracemalloc and keep what it allocated in step_allocations (slow, for debugging)
+    step_allocations = None #(peak bytes allocated during the last update(), bytes of them still held after it) with debug_allocations
+    _counts = None #(bodies, particles) at the end of the last update(), for debug_workspace
+
+    particle_memory_cap = 4 * 2 ** 20 #bytes of scratch memory the particle kernel may use at once (particles are processed in blocks that fit)
+
+    particle_solver = 'particle_mesh' #how particles with mass pull on each other, 'particle_mesh' or 'direct' (the bodies always use the direct sum)
+    mesh_size = 64 #grid cells per axis for the particle_mesh solver
+    _mesh = None
+
+    def __init__(self, builder, integrator=None):
         self._builder = builder
+        if integrator is not None:
+            get_integrator(integrator) #(fails early on an unknown name)
+            self.integrator = integrator
         self.__reset_universe__()
 
     def update(self):
         t = 0.01 * self.time_scale #The time step scale value
-        self.simTotalTime += t #second
-
-        self.verts_coord = self._update_vectorized(t)
-        if self.builder.parts_coord is not None:
-            particles = self._particle_vectorized(t)
-            vretices = np.append(self.verts_coord, particles, axis=0) / self.size_scale
-            colors = self.colors = np.append(self.verts_color, self.parts_color, axis=0)
-            return vretices, colors
+        self.collision_events = []
+        self.merge_events = []
+        allocations = self.workspace.allocations
+        tracing = self.debug_allocations and not tracemalloc.is_tracing() #(someone else's tracing is left running)
+        if tracing:
+            tracemalloc.start()
+        if self.debug_allocations:
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+
+        if self.physics_step is None:
+            self.simTotalTime += t #second
+            self.substeps = 1
+            self._event_time = self.simTotalTime
+            self._step(t)
+        else:
+            #a fixed size step run as many times as it takes to cover the frame's time (the remainder carries over)
+            self._clock += t
+            self.substeps = min(int(self._clock / self.physics_step + 1e-9), self.max_substeps) #(so rounding does not hold back a whole step)
+            if self.substeps == self.max_substeps:
+                self._clock = 0 #(drop what the cap left over instead of building up a backlog)
+            else:
+                self._clock -= self.substeps * self.physics_step
+            if self.substeps:
+                self._substeps(self.physics_step, self.substeps)
+            self.simTotalTime += self.substeps * self.physics_step
+
+        self._since_rebase += 1
+        if self._floating and self._since_rebase >= self.rebase_every:
+            self._rebase(self._origin_of(self.verts_coord))
+        self._compact_particles()
+
+        #the frame goes into the workspace too, so the arrays returned are overwritten by the next update() (copy them to keep them)
+        n = self.verts_coord.shape[0]
+        p = self.parts_coord.shape[0] if self.parts_coord is not None else 0
+        vretices = self.workspace.get('view_coord', (n + p, 3), self.verts_coord.dtype)
+        self._view(self.verts_coord, out=vretices[:n])
+        if self.parts_coord is not None:
+            self._view(self.parts_coord, out=vretices[n:])
+            colors = self.colors = self.workspace.get('view_color', (n + p,) + self.verts_color.shape[1:], self.verts_color.dtype)
+            colors[:n] = self.verts_color
+            colors[n:] = self.parts_color
         else:
-            vretices = self.verts_coord / self.size_scale
             colors = self.verts_color
-            return vretices, colors
+
+        if self.debug_workspace:
+            assert self._counts != (n, p) or self.workspace.allocations == allocations, \
+                '%d workspace buffers allocated by an update() with the same %d bodies and %d particles' % (self.workspace.allocations - allocations, n, p)
+        self._counts = (n, p)
+        if self.debug_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            self.step_allocations = (peak - traced, current - traced)
+            if tracing:
+                tracemalloc.stop()
+        return vretices, colors
+
+    def _view(self, coord, out=None):
+        #Engine coordinates to scene units, the origin is added back in the engine's precision (float32 goes straight to the renderer).
+        out = np.divide(coord, self.size_scale, out=out)
+        out += (self.origin / self.size_scale).astype(coord.dtype)
+        return out
+
+    @property
+    def far(self):
+        #Where removed particles are put, out of sight but small enough that their squared distances stay finite.
+        return 1e18 if self._floating else 1e50
+
+    def _origin_of(self, coord):
+        #The point the floating origin follows (in float64 and in the same frame as coord).
+        if self.origin_body is not None:
+            return np.array(coord[self.origin_body], dtype=np.float64)
+        mass = np.asarray(self.verts_mass, dtype=np.float64)
+        return np.dot(mass, np.asarray(coord, dtype=np.float64)) / mass.sum()
+
+    def _rebase(self, shift):
+        #Move the floating origin by shift meters, every coordinate moves the other way so nothing moves in the world.
+        #Only the positions change, the velocities, cached accelerations and jerks do not depend on the origin.
+        self.origin = self.origin + shift
+        shift = shift.astype(self.dtype)
+        self.verts_coord -= shift
+        if self.parts_coord is not None:
+            self.parts_coord -= shift
+        self._since_rebase = 0
 
 
     def __reset_timers__(self):
         self.simStartTime = time.time()
         self.simLastTime = self.simStartTime
         self.simTotalTime = 0
+        self._clock = 0 #simulated time requested but not yet stepped (less than one physics step)
+        self._since_rebase = 0
+        self._event_time = 0 #the simulated time the step being taken ends at (stamped on collision events)
 
     def __reset_universe__(self):
         self.__load_builder__()
@@ -57,129 +206,563 @@ class newtonianLawOfGravitation():
 
     def __load_builder__(self):
         self.builder = self._builder(self.size_scale)
-
-        self.verts_coord  = self.builder.verts_coord
-        self.verts_radius = self.builder.verts_radius
+        dtype = self.dtype
+        self._floating = np.dtype(dtype) != np.float64
+
+        #the builders work in float64 world coordinates, in float32 they start out centered on the floating origin
+        self.verts_mass   = np.asarray(self.builder.verts_mass, dtype=dtype)
+        self.origin = self._origin_of(self.builder.verts_coord) if self._floating else np.zeros(3)
+        self.verts_coord  = np.asarray(self.builder.verts_coord - self.origin, dtype=dtype)
+        self.verts_radius = np.asarray(self.builder.verts_radius, dtype=dtype)
         self.verts_color  = self.builder.verts_color
-        self.verts_vel    = self.builder.verts_vel
-        self.verts_mass   = self.builder.verts_mass
-
-
-
+        self.verts_vel    = np.asarray(-self.builder.verts_vel, dtype=dtype) #the builders give body velocities in the opposite direction to particle velocities
+        if getattr(self.builder, 'merge_bodies', None) is not None:
+            self.merge_bodies = self.builder.merge_bodies #(the scene asks for its bodies to merge, or not to)
+        self._pairs = None
+        self._forces = None
+        self._block = None
+        self._hermite = None
+        self._grids = None
+        if self.workspace is None:
+            self.workspace = Workspace() #(kept across resets, the same scene needs the same buffers)
+        self._counts = None
+
+        self._parts_pool = None
+        self.parts_coord = self.parts_radius = self.parts_color = self.parts_vel = self.parts_mass = self.parts_id = self.parts_host = None
         if self.builder.parts_coord is not None:
             epsilon = 0.000001 #helps avoid divide by zero errors on first cycle
-            self.parts_coord  = (self.builder.parts_coord + epsilon)
-            self.parts_radius = self.builder.parts_radius
+            self.parts_coord  = np.asarray(self.builder.parts_coord + epsilon - self.origin, dtype=dtype)
+            self.parts_radius = np.asarray(self.builder.parts_radius, dtype=dtype)
             self.parts_color  = self.builder.parts_color
-            self.parts_vel    = self.builder.parts_vel
+            self.parts_vel    = np.asarray(self.builder.parts_vel, dtype=dtype)
+            self.parts_mass   = getattr(self.builder, 'parts_mass', None)
+            if self.parts_mass is not None:
+                self.parts_mass = np.asarray(self.parts_mass, dtype=dtype)
+            self.parts_id = np.arange(self.parts_coord.shape[0])
+            self.parts_host = self._kepler_hosts(self.parts_coord)
+            self._parts_pool = ParticlePool(self._particle_arrays(), self.parts_capacity)
+            self._bind_particles()
+        self.parts_remap = None
+        self.parts_generation += 1
+        self._next_id = self.parts_coord.shape[0] if self.parts_coord is not None else 0
+        self.collision_events = []
+        self.merge_events = []
+        self.verts_remap = None
+
+    def _particle_arrays(self):
+        arrays = {'coord': self.parts_coord, 'vel': self.parts_vel, 'radius': self.parts_radius, 'color': self.parts_color,
+                  'id': self.parts_id}
+        if self.parts_mass is not None:
+            arrays['mass'] = self.parts_mass
+        if self.parts_host is not None:
+            arrays['host'] = self.parts_host
+        return arrays
+
+    def _bind_particles(self):
+        #Point the parts_ arrays at the pool's live rows (again after the pool compacts or grows).
+        self.parts_coord = self._parts_pool.view('coord')
+        self.parts_vel = self._parts_pool.view('vel')
+        self.parts_radius = self._parts_pool.view('radius')
+        self.parts_color = self._parts_pool.view('color')
+        self.parts_id = self._parts_pool.view('id')
+        if 'mass' in self._parts_pool.arrays:
+            self.parts_mass = self._parts_pool.view('mass')
+        if 'host' in self._parts_pool.arrays:
+            self.parts_host = self._parts_pool.view('host')
+
+    def spawn_particles(self, coord, vel, radius, color, mass=None):
+        #Add particles at world coordinates (meters), they take the rows of removed particles first and the pool grows when full.
+        #The mass is only kept when the scene's particles have masses. Returns the new particles' rows.
+        coord = np.asarray(np.atleast_2d(coord) - self.origin, dtype=self.dtype)
+        ids = np.arange(self._next_id, self._next_id + coord.shape[0])
+        self._next_id += coord.shape[0]
+        values = {'coord': coord, 'vel': np.atleast_2d(vel), 'radius': radius, 'color': np.atleast_2d(color), 'mass': mass, 'id': ids,
+                  'host': np.full(coord.shape[0], -1)} #(new particles are integrated)
+        if self._parts_pool is None:
+            self.parts_coord, self.parts_vel = coord, np.asarray(values['vel'], dtype=self.dtype)
+            self.parts_radius = np.asarray(np.broadcast_to(radius, coord.shape[:1]), dtype=self.dtype)
+            self.parts_color = np.array(values['color'], dtype=float)
+            self.parts_id = ids
+            self.parts_host = values['host'] if self.kepler_particles else None
+            self._parts_pool = ParticlePool(self._particle_arrays(), self.parts_capacity)
+            rows = np.arange(coord.shape[0])
+        else:
+            rows = self._parts_pool.spawn(values)
+        self._bind_particles()
+
+        #the cached forces have no rows for the new particles, the integrators start over from the current state
+        self._forces = None
+        self._block = None
+        self._hermite = None
+        self.parts_remap = None
+        self.parts_generation += 1
+        return rows
+
+    def _compact_particles(self):
+        #Once enough of the pool's rows are dead, move the live particles to the front so the dead ones are no longer stepped.
+        #parts_remap and parts_generation let anything keeping per particle data follow the move.
+        if self._parts_pool is None or self._parts_pool.dead_fraction() <= self.compact_fraction:
+            return
+        remap = self._parts_pool.compact()
+        keep = np.flatnonzero(remap >= 0)
+        self._bind_particles()
+
+        rows = lambda a: None if a is None else a[keep]
+        if self._forces is not None:
+            self._forces = (self._forces[0], rows(self._forces[1]), rows(self._forces[2]))
+        if self._block is not None and 'parts_accel' in self._block:
+            self._block['parts_accel'] = rows(self._block['parts_accel'])
+            self._block['parts_level'] = rows(self._block['parts_level'])
+        if self._hermite is not None:
+            forces = self._hermite['forces']
+            self._hermite['forces'] = forces[:2] + tuple(rows(a) for a in forces[2:])
+        self.parts_remap = remap
+        self.parts_generation += 1
+
+    def _step(self, t):
+        #One time step of the bodies and particles with the selected integrator.
+        kepler = self._kepler_start()
+        self._refresh_grids()
+        if self.integrator == 'euler' and self.parts_mass is not None:
+            self._update_massive_particles(t)
+        elif self.integrator == 'euler':
+            self.verts_coord = self._update_vectorized(t)
+            if self.parts_coord is not None:
+                self.parts_coord = self._particle_vectorized(t)
+        else:
+            integrate(self, t)
+        if kepler is not None:
+            self._kepler_finish(kepler, t)
+        self._merge_bodies()
+
+    def _refresh_grids(self):
+        #(Re)build the particles' acceleration grids around the bodies where they are now, when they moved or merged or every grid_every steps.
+        if not self.particle_grids or self.parts_coord is None or self.parts_mass is not None:
+            self._grids = None
+            return
+        if self._grids is not None and self._grids_age < self.grid_every and not self._grids.moved(self.verts_coord):
+            self._grids_age += 1
+            return
+        self._grids = AccelerationGrids(self.verts_coord, self.verts_mass, self.verts_radius, self.G, self.grid_size, self.grid_reach,
+                                        self.parts_radius.max() if self.parts_radius.shape[0] else 0.)
+        self._grids_age = 1
+
+    def _kepler_hosts(self, coord):
+        #The body pulling hardest on each particle, the one it orbits analytically with kepler_particles (None when it is off).
+        #Particles with mass pull on each other so they are always integrated.
+        if not self.kepler_particles or self.parts_mass is not None or self.verts_coord.shape[0] == 0:
+            return None
+        slope = self.verts_coord[None, :, :].astype(np.float64) - coord[:, None, :]
+        pull = self.verts_mass[None, :] / np.einsum('ijk,ijk->ij', slope, slope)
+        return np.argmax(pull, axis=1)
+
+    def _kepler_promote(self, host, r):
+        #Which of the particles (orbiting host, r from it) the other bodies pull on too hard to stay on a Kepler orbit.
+        #The other bodies' tidal pull (their pull on the particle less their pull on the host) is at most
+        #G*m*(1/(D-r)^2 - 1/D^2) for a body D from the host, against the host's own G*M/r^2.
+        n = self.verts_coord.shape[0]
+        coord = self.verts_coord.astype(np.float64)
+        between = np.sqrt(np.sum((coord[:, None, :] - coord[None, :, :]) ** 2, axis=2))
+        between[np.arange(n), np.arange(n)] = np.inf #(the host itself does not count)
+        dist = between[host]
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            tidal = (1 / (dist - r[:, None]) ** 2 - 1 / dist ** 2) * self.verts_mass[None, :]
+            tidal = np.where(dist > r[:, None], tidal, np.inf).sum(axis=1)
+            return ~(tidal * r * r <= self.kepler_threshold * self.verts_mass[host])
+
+    def _kepler_start(self):
+        #Before the step: the particles that stay on Kepler orbits, with their hosts and their positions and velocities relative to them.
+        #Those the other bodies pull on too hard are handed over to the integrator for good. The integrators leave the rest out
+        #of the particle gforce (see _particle_forces) while they step everything else.
+        if self.parts_host is None or self.integrator not in ('euler', 'leapfrog', 'yoshida4', 'yoshida6'):
+            return None
+        rows = np.flatnonzero(self.parts_host >= 0)
+        host = self.parts_host[rows]
+        coord = self.parts_coord[rows] - self.verts_coord[host]
+        if rows.shape[0] and self.verts_coord.shape[0] > 1:
+            r = np.sqrt(np.einsum('ij,ij->i', coord, coord))
+            reach = np.zeros(self.verts_coord.shape[0])
+            np.maximum.at(reach, host, r)
+            hosts = np.flatnonzero(reach)
+            #(the pull only grows with r, so unless the farthest particle of some host goes none does)
+            promote = self._kepler_promote(host, r) if self._kepler_promote(hosts, reach[hosts]).any() else np.zeros(0, dtype=bool)
+            if promote.any():
+                self.parts_host[rows[promote]] = -1
+                self._forces = None #(the cached forces left them out)
+                keep = ~promote
+                rows, host, coord = rows[keep], host[keep], coord[keep]
+        if rows.shape[0] == 0:
+            return None
+        self._integrated = np.flatnonzero(self.parts_host < 0)
+        return (rows, host, coord, self.parts_vel[rows] - self.verts_vel[host])
+
+    def _kepler_finish(self, kepler, t):
+        #After the step: move the particles along their orbits in the host's frame and add the host's own motion back in.
+        rows, host, coord, vel = kepler
+        mu = self.G * self.verts_mass[host].astype(np.float64)
+        coord, vel = kepler_drift(coord.astype(np.float64), vel.astype(np.float64), mu, t)
+        self.parts_coord[rows] = self.verts_coord[host] + coord
+        self.parts_vel[rows] = self.verts_vel[host] + vel
+        self._integrated = None
+        #the integrators' collision tests left them out, so the ones that reached their host (or another body) are removed here
+        hit = find_collisions(self.parts_coord[rows], self.parts_radius[rows], self.verts_coord, self.verts_radius)[0]
+        if hit.shape[0]:
+            self._remove_particles(rows[np.unique(hit)])
+
+    def _particle_forces(self, coord):
+        #_particle_accelerations, but with particles on Kepler orbits only the integrated ones get a gforce (the others are tested for collisions in _kepler_finish).
+        if self._integrated is None:
+            return self._particle_accelerations(coord)
+        accel = np.zeros_like(coord)
+        uncollided = np.ones(coord.shape[0], dtype=bool)
+        if self._integrated.shape[0]:
+            accel[self._integrated], uncollided[self._integrated] = self._particle_accelerations_at(self._integrated)
+        return accel, uncollided
+
+    def _merge_bodies(self):
+        #Merge every group of touching bodies into its most massive one, at their center of mass with their total mass
+        #and momentum (and the volume of them all). The body arrays shrink in place and the caches built on them start over.
+        #Returns whether any bodies merged.
+        n = self.verts_coord.shape[0]
+        if not self.merge_bodies or n < 2:
+            return False
+        i, j = overlapping_pairs(self.verts_coord, self.verts_radius)
+        if i.shape[0] == 0:
+            return False
+
+        #every body takes the lowest label it touches until the groups stop changing
+        group = np.arange(n)
+        while True:
+            low = np.minimum(group[i], group[j])
+            labels = group.copy()
+            np.minimum.at(labels, i, low)
+            np.minimum.at(labels, j, low)
+            labels = labels[labels]
+            if (labels == group).all():
+                break
+            group = labels
+
+        mass = self.verts_mass.astype(np.float64)
+        order = np.lexsort((-mass, group))
+        first = np.r_[True, group[order][1:] != group[order][:-1]]
+        survivor = np.empty(n, dtype=int)
+        survivor[group[order][first]] = order[first] #(the most massive body of each group)
+        survivor = survivor[group]
+
+        total = np.bincount(survivor, mass, n)
+        merged = np.flatnonzero(np.bincount(survivor, minlength=n) > 1)
+        for array in (self.verts_coord, self.verts_vel): #(center of mass and momentum, in float64)
+            weighted = np.stack([np.bincount(survivor, mass * array[:, ax], n) for ax in range(3)], axis=1)
+            array[merged] = weighted[merged] / total[merged, None]
+        volume = np.bincount(survivor, self.verts_radius.astype(np.float64) ** 3, n)
+        self.verts_radius[merged] = np.cbrt(volume[merged])
+        self.verts_mass[merged] = total[merged]
+
+        absorbed = np.flatnonzero(survivor != np.arange(n))
+        self.merge_events.extend(zip(survivor[absorbed].tolist(), absorbed.tolist(), [self._event_time] * absorbed.shape[0]))
+
+        keep = np.flatnonzero(survivor == np.arange(n))
+        m = keep.shape[0]
+        self.verts_remap = np.full(n, -1, dtype=int)
+        self.verts_remap[keep] = np.arange(m)
+        for name in ('verts_coord', 'verts_vel', 'verts_mass', 'verts_radius', 'verts_color'):
+            array = getattr(self, name)
+            array[:m] = array[keep] #(in place, the rows left over at the end are dropped from view)
+            setattr(self, name, array[:m])
+        if self.origin_body is not None:
+            self.origin_body = self.verts_remap[survivor[self.origin_body]]
+        if self.parts_host is not None: #(particles orbiting an absorbed body go on orbiting what it merged into)
+            orbiting = self.parts_host >= 0
+            self.parts_host[orbiting] = self.verts_remap[survivor[self.parts_host[orbiting]]]
+
+        self._pairs = None
+        self._forces = None
+        self._block = None
+        self._hermite = None
+        self.parts_generation += 1
+        return True
+
+    def _substeps(self, t, k):
+        #k steps of t in a row, only the state after the last one is drawn.
+        for i in range(k):
+            self._event_time = self.simTotalTime + (i + 1) * t
+            self._step(t) #(merging any bodies that touch after every step)
+
+    def _evaluate_forces(self):
+        #The accelerations of the bodies and of the particles at their current positions,
+        #plus the mask of the particles that are not touching a body (both None without particles).
+        accel = self._body_accelerations(self.verts_coord)
+        if self.parts_coord is None:
+            return accel, None, None
+        if self.parts_mass is not None:
+            accel += self._particle_pull(self.verts_coord)
+
+        parts_accel, uncollided = self._particle_forces(self.parts_coord)
+        if self.parts_mass is not None:
+            parts_accel += self._particle_self_gravity(self.parts_coord)
+        return accel, parts_accel, uncollided
+
+    def _kick(self, forces, t):
+        #(the forces are kept for the next kick, so they are scaled into the workspace rather than in place)
+        get = self.workspace.get
+        self.verts_vel += np.multiply(forces[0], t, out=get('step_verts', forces[0].shape, forces[0].dtype))
+        if forces[1] is not None:
+            self.parts_vel += np.multiply(forces[1], t, out=get('step_parts', forces[1].shape, forces[1].dtype))
+
+    def _drift(self, t):
+        get = self.workspace.get
+        self.verts_coord += np.multiply(self.verts_vel, t, out=get('step_verts', self.verts_vel.shape, self.verts_vel.dtype))
+        if self.parts_coord is not None:
+            self.parts_coord += np.multiply(self.parts_vel, t, out=get('step_parts', self.parts_vel.shape, self.parts_vel.dtype))
+
+    def _update_massive_particles(self, t):
+        #The euler step when the particles have mass: they and the bodies pull on each other, so both are kicked with
+        #the forces from the same positions (stepping the bodies first would leave the two pulls unequal and drift the momentum).
+        forces = self._evaluate_forces()
+        self._kick(forces, t)
+        self._drift(t)
+        self._remove_particles(~forces[2])
 
     def _update_vectorized(self, t):
-        ax0, ax1, ax2 = 0, 1, 2  # allows the ability to select which axes (plane) we want to use (basically X=0,Y=1 or Y=1,Z=2 and so on..)
-        mat_loc = self.verts_coord
-
-        n = mat_loc.shape[0]
-        mask = ~np.eye(n, dtype=bool)
-        loc = np.broadcast_to(mat_loc, (n, n, mat_loc.shape[-1]))[mask].reshape(n, n - 1, -1)
-
-        repeater = np.repeat(self.verts_coord, n-1, axis=0).reshape(loc.shape[0], n-1, 3)
-        mat_slope = loc - repeater # rise and run -or- delta positions #todo fix sign/order??
-
-        mat_d_z = mat_slope[:,::,ax2:ax2+1] # delta height
-        mat_d_y = mat_slope[:,::,ax1:ax1+1] # rise / delta Y
-        mat_d_x = mat_slope[:,::,ax0:ax0+1] # run / delta X
-
-        mat_base = np.sqrt(mat_d_x ** 2 + mat_d_y ** 2) # the "base" lenght of the triangle which describes the change in z
-        mat_hyp = np.sqrt(mat_base ** 2 + mat_d_z ** 2) # the actual "radius" length from the base vertex "verts_coord[i]" to all other vertexes
-
-        mat_az_tan = np.arctan2(mat_d_y, mat_d_x)  # radians on the x,y plane formed from our base vertex to the other vertex
-        mat_elv_tan = np.arctan2(mat_d_z, mat_base) # elevation radians -or- the angle formed from the base triangle to the tip of the gforce vector
-
-        space = mat_hyp ** 2
-        force = self.G * self.verts_mass
-        mat_g = np.transpose(force / np.transpose(space)) #Newton's gravity equation
-
-        mat_base2 = mat_g * np.cos(mat_elv_tan) #a vector residing only on the x,y plane denoting the base length of the gforce vector triangle
-
-        mat_g_x = mat_base2 * np.cos(mat_az_tan)
-        mat_g_y = mat_base2 * np.sin(mat_az_tan)
-        mat_g_z = mat_g * np.sin(mat_elv_tan)  # the height (from a point rotating around the x,y plane this vector goes straight up z and is connected to the tip of gforce vector)
-
-        sort = np.nonzero(mask)[1].argsort()
-        mat_g_x = mat_g_x.ravel()[sort].reshape(mat_g_x.shape)
-        mat_g_y = mat_g_y.ravel()[sort].reshape(mat_g_y.shape)
-        mat_g_z = mat_g_z.ravel()[sort].reshape(mat_g_z.shape)
-
-        mat_axis_gforce = np.sum(np.dstack((mat_g_x, mat_g_y, mat_g_z)), axis=1)
-
         #now apply the gforce vectors to the actual coordinate's positions and velocities
-        self.verts_vel += mat_axis_gforce * t
-        self.verts_coord -= self.verts_vel * t
+        accel = self._body_accelerations(self.verts_coord)
+        accel *= t
+        self.verts_vel += accel
+        self.verts_coord += np.multiply(self.verts_vel, t, out=accel) #(the step's gforce is spent, its array holds the drift)
 
         return self.verts_coord
 
+    def _body_pairs(self):
+        #The (i, j) index pairs with i < j, each pair of bodies appears exactly once.
+        #The layout only depends on the number of bodies so it is kept between steps (along with the gathered masses).
+        n = self.verts_coord.shape[0]
+        if self._pairs is None or self._pairs[0].shape[0] != n * (n - 1) // 2:
+            pairs_i, pairs_j = np.triu_indices(n, 1)
+            self._pairs = (pairs_i, pairs_j, self.verts_mass[pairs_i], self.verts_mass[pairs_j])
+        return self._pairs
+
+    def _body_accelerations(self, coord):
+        #Direct sum of G*m*r_vec/|r|^3 over every pair of bodies, each pair is only computed once and
+        #Newton's third law gives the equal and opposite pull on the other body of the pair.
+        n = coord.shape[0]
+        pairs_i, pairs_j, mass_i, mass_j = self._body_pairs()
+
+        m = pairs_i.shape[0]
+        get = self.workspace.get
+        #(mode='clip' writes straight into out, the default 'raise' buffers it in a temporary copy, and the pair indices are always valid)
+        slope = np.take(coord, pairs_j, axis=0, mode='clip', out=get('pair_slope', (m, 3), coord.dtype))
+        slope -= np.take(coord, pairs_i, axis=0, mode='clip', out=get('pair_coord', (m, 3), coord.dtype)) # delta positions pointing from body i towards body j
+        inv_hyp = np.einsum('ij,ij->i', slope, slope, out=get('pair_inv_hyp', (m,), coord.dtype))
+        np.sqrt(inv_hyp, out=inv_hyp)
+        np.divide(1, inv_hyp, out=inv_hyp) # one over the distance between the pair
+        inv_hyp2 = np.multiply(inv_hyp, inv_hyp, out=get('pair_inv_hyp2', (m,), coord.dtype))
+        s = get('pair_s', (m,), coord.dtype)
+        pull = get('pair_pull', (m,), np.result_type(coord, mass_j))
+
+        mat_axis_gforce = np.zeros_like(coord) #(a new array, the integrators keep the gforce of earlier evaluations)
+        for ax in range(3):
+            np.multiply(slope[:, ax], inv_hyp, out=s) #(the unit vector first, a cubed inverse distance underflows float32 beyond Saturn)
+            s *= inv_hyp2
+            np.add.at(mat_axis_gforce[:, ax], pairs_i, np.multiply(s, mass_j, out=pull))
+            np.subtract.at(mat_axis_gforce[:, ax], pairs_j, np.multiply(s, mass_i, out=pull))
+
+        mat_axis_gforce *= self.G
+        return mat_axis_gforce
 
     def _particle_vectorized(self, t):
+        mat_axis_gforce, uncollided = self._particle_forces(self.parts_coord)
+        if self.parts_mass is not None:
+            mat_axis_gforce += self._particle_self_gravity(self.parts_coord)
 
-        ax0, ax1, ax2 = 0, 1, 2  # allows the ability to select which axes (plane) we want to use (basically X=0,Y=1 or Y=1,Z=2 and so on..)
-
-        loc = np.tile(self.verts_coord, (self.parts_coord.shape[0], 1, 1))
-
-        i2 = self.verts_coord.shape[0]
-        repeater = np.repeat(self.parts_coord, i2, axis=0).reshape(loc.shape[0], i2, 3) #the mat for each particle to calc against each vert
-
-        mat_slope = loc - repeater # rise and run -or- delta positions
-
-        mat_d_z = mat_slope[:,::,ax2:ax2+1] # delta height
-        mat_d_y = mat_slope[:,::,ax1:ax1+1] # rise / delta Y
-        mat_d_x = mat_slope[:,::,ax0:ax0+1] # run / delta X
-
-        mat_base = np.sqrt(mat_d_x ** 2 + mat_d_y ** 2) # the "base" lenght of the triangle which describes the change in z
-        mat_hyp = np.sqrt(mat_base ** 2 + mat_d_z ** 2) # the actual "radius" length from the base vertex "verts_coord[i]" to all other vertexes
-
-        mat_az_tan = np.arctan2(mat_d_y, mat_d_x)  # radians on the x,y plane formed from our base vertex to the other vertex
-        mat_elv_tan = np.arctan2(mat_d_z, mat_base) # elevation radians -or- the angle formed from the base triangle to the tip of the gforce vector
-
-        space = mat_hyp ** 2
-        force = self.G * self.verts_mass
-        force = np.tile(force, space.shape[0]).reshape(space.shape) #prepare for opperaton on all mat_space rows
-
-        mat_g = force / space #Newton's gravity equation
-        mat_base2 = mat_g * np.cos(mat_elv_tan) #a vector residing only on the x,y plane denoting the base length of the gforce vector triangle
+        mat_axis_gforce *= t
+        self.parts_vel += mat_axis_gforce
+        self.parts_coord += np.multiply(self.parts_vel, t, out=mat_axis_gforce)
 
-        mat_g_x = mat_base2 * np.cos(mat_az_tan)
-        mat_g_y = mat_base2 * np.sin(mat_az_tan)
-        mat_g_z = mat_g * np.sin(mat_elv_tan)  # the height (from a point rotating around the x,y plane this vector goes straight up z and is connected to the tip of gforce vector)
-
-        mat_axis_gforce = np.sum(np.dstack((mat_g_x, mat_g_y, mat_g_z)), axis=1)
+        #Uncomment this section to use fancy indexing to remove the collided elements and resize the arrays.
+        #Note: this may cause a jump in speed (as cpu load drops) noticable if many particles are removed suddenly.
+        #self.parts_coord = self.parts_coord[uncollided]
+        #self.parts_color = self.parts_color[uncollided]
+        #self.parts_radius = self.parts_radius[uncollided]
+        #self.parts_vel = self.parts_vel[uncollided]
 
-        self.parts_vel += mat_axis_gforce * t
-        self.parts_coord += self.parts_vel * t
+        #Otherwise use this section to just set everything to zery so particles are invisible (they are still processed until the particle pool compacts them away, see _compact_particles)
+        self._remove_particles(~uncollided)
 
-        #now do collision detection and keep only particles that have not collided with any bodies
-        uncollided = mat_hyp - self.verts_radius.reshape(self.verts_radius.shape[0],1) #subtract the particles's coord from the distance to the body
-        uncollided = np.prod(uncollided, axis=1) #get product for each particle's rows (if there are zeros anywhere then result will be zero)
-        indeces_uncollided = np.prod(uncollided, axis=1).clip(0).nonzero() #get only the indexes of the verts that are not zero as the indices to keep
+        return self.parts_coord
 
-        #Uncomment this section to use fancy indexing to remove the collided elements and resize the arrays.
-        #Note: this may cause a jump in speed (as cpu load drops) noticable if many particles are removed suddenly.
-        #self.parts_coord = self.parts_coord[indeces_uncollided]
-        #self.parts_color = self.parts_color[indeces_uncollided]
-        #self.parts_radius = self.parts_radius[indeces_uncollided]
-        #self.parts_vel = self.parts_vel[indeces_uncollided]
-
-        #Otherwise use this section to just set everything to zery so particles are invisible (but will still be processed and initial array size never changes)
-        indeces_collided = np.delete(np.arange(self.parts_coord.shape[0]), indeces_uncollided)
-        self.parts_coord[indeces_collided] = 1*10**50 #put them very far away and out of sight!
+    def _remove_particles(self, indeces_collided):
+        self._record_collisions(indeces_collided)
+        self.parts_coord[indeces_collided] = self.far #put them very far away and out of sight!
         self.parts_color[indeces_collided] *= 0
         self.parts_radius[indeces_collided] *= 0
         self.parts_vel[indeces_collided] *= 0
-
-        return self.parts_coord
-
+        if self.parts_mass is not None:
+            self.parts_mass[indeces_collided] *= 0
+        if self.parts_host is not None:
+            self.parts_host[indeces_collided] = -1
+        if self._forces is not None:
+            self._forces[1][indeces_collided] = 0 #(so the next kick leaves them where they are)
+        if self._block is not None:
+            self._block['parts_accel'][indeces_collided] = 0
+            self._block['parts_level'][indeces_collided] = 0
+        if self._parts_pool is not None:
+            self._parts_pool.kill(indeces_collided) #(free for new particles, and moved out of the stepped rows by the next compaction)
+
+    def _record_collisions(self, rows, bodies=None):
+        #Log a collision event for each of the particles (a mask or rows) that just hit a body,
+        #when the body is not known it is the one whose surface is closest.
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        if self._parts_pool is not None:
+            keep = self._parts_pool.alive[rows] #(removed particles do not hit anything again)
+            rows = rows[keep]
+            bodies = None if bodies is None else np.asarray(bodies)[keep]
+        if rows.shape[0] == 0:
+            return
+        if bodies is None:
+            bodies = nearest_bodies(self.parts_coord[rows], self.parts_radius[rows], self.verts_coord, self.verts_radius)
+        self.collision_events.extend(zip(self.parts_id[rows].tolist(), np.asarray(bodies).tolist(), [self._event_time] * rows.shape[0]))
+
+    def _uncollided(self, coord, radius):
+        #The mask of the particles not touching any body from the spatial hash broad phase (see collisions.py).
+        uncollided = np.ones(coord.shape[0], dtype=bool)
+        uncollided[find_collisions(coord, radius, self.verts_coord, self.verts_radius)[0]] = False
+        return uncollided
+
+    def _particle_accelerations(self, coord):
+        #The gforce on each particle from all of the bodies, plus a boolean mask of the particles that have not collided with any body.
+        if self._grids is not None:
+            guess = self._grid_hosts[1] if self._grid_hosts is not None and self._grid_hosts[0] == self.parts_generation else None
+            accel, uncollided, host = self._grids.accelerations(coord, self.parts_radius, self.verts_coord, self.verts_mass,
+                                                                self.verts_radius, self.G, guess)
+            self._grid_hosts = (self.parts_generation, host)
+            return accel, uncollided
+        if self.collision_detection == 'spatial_hash':
+            accel = direct_accelerations(coord, self.verts_coord, self.verts_mass, self.G, memory_cap=self.particle_memory_cap,
+                                         workspace=self.workspace)[0]
+            return accel, self._uncollided(coord, self.parts_radius)
+        return direct_accelerations(coord, self.verts_coord, self.verts_mass, self.G,
+                                    target_radius=self.parts_radius, source_radius=self.verts_radius,
+                                    memory_cap=self.particle_memory_cap, workspace=self.workspace)
+
+    def _body_accelerations_and_jerks(self, coord, vel):
+        #The gforce and jerk on every body from the same pair deltas as _body_accelerations (each pair once, equal and opposite).
+        pairs_i, pairs_j, mass_i, mass_j = self._body_pairs()
+
+        m = pairs_i.shape[0]
+        get = self.workspace.get
+        dtype = np.result_type(coord, vel)
+        slope = np.take(coord, pairs_j, axis=0, mode='clip', out=get('pair_slope', (m, 3), coord.dtype))
+        slope -= np.take(coord, pairs_i, axis=0, mode='clip', out=get('pair_coord', (m, 3), coord.dtype))
+        dvel = np.take(vel, pairs_j, axis=0, mode='clip', out=get('pair_dvel', (m, 3), vel.dtype))
+        dvel -= np.take(vel, pairs_i, axis=0, mode='clip', out=get('pair_vel', (m, 3), vel.dtype))
+        inv_hyp = np.einsum('ij,ij->i', slope, slope, out=get('pair_inv_hyp', (m,), coord.dtype))
+        np.sqrt(inv_hyp, out=inv_hyp)
+        np.divide(1, inv_hyp, out=inv_hyp)
+        inv_hyp3 = np.multiply(inv_hyp, inv_hyp, out=get('pair_inv_hyp3', (m,), coord.dtype))
+        rv = np.einsum('ij,ij->i', slope, dvel, out=get('pair_rv', (m,), dtype))
+        rv *= inv_hyp3
+        rv *= 3
+        inv_hyp3 *= inv_hyp
+        s = get('pair_s', (m,), dtype)
+        pull = get('pair_pull', (m,), np.result_type(dtype, mass_j))
+
+        accel = np.zeros_like(coord) #(new arrays, the hermite integrator keeps the last evaluation's for its corrector)
+        jerk = np.zeros_like(coord)
+        for ax in range(3):
+            np.multiply(slope[:, ax], inv_hyp3, out=s)
+            np.add.at(accel[:, ax], pairs_i, np.multiply(s, mass_j, out=pull))
+            np.subtract.at(accel[:, ax], pairs_j, np.multiply(s, mass_i, out=pull))
+            np.multiply(rv, slope[:, ax], out=s)
+            np.subtract(dvel[:, ax], s, out=s)
+            s *= inv_hyp3
+            np.add.at(jerk[:, ax], pairs_i, np.multiply(s, mass_j, out=pull))
+            np.subtract.at(jerk[:, ax], pairs_j, np.multiply(s, mass_i, out=pull))
+
+        accel *= self.G
+        jerk *= self.G
+        return accel, jerk
+
+    def _particle_accelerations_and_jerks(self, coord, vel):
+        #The gforce and jerk on every particle from the bodies, and the mask of the particles not touching a body
+        #(the pull of particles with mass on each other is added to the gforce but left out of the jerk).
+        if self.collision_detection == 'spatial_hash':
+            accel, jerk, _ = direct_accelerations_and_jerks(coord, vel, self.verts_coord, self.verts_vel, self.verts_mass, self.G,
+                                                            memory_cap=self.particle_memory_cap, workspace=self.workspace)
+            uncollided = self._uncollided(coord, self.parts_radius)
+        else:
+            accel, jerk, uncollided = direct_accelerations_and_jerks(coord, vel, self.verts_coord, self.verts_vel, self.verts_mass, self.G,
+                                                                     target_radius=self.parts_radius, source_radius=self.verts_radius,
+                                                                     memory_cap=self.particle_memory_cap, workspace=self.workspace)
+        if self.parts_mass is not None:
+            accel += self._particle_self_gravity(coord)
+        return accel, jerk, uncollided
+
+    def _body_accelerations_at(self, index):
+        #The gforce on only the indexed bodies from all of the bodies (and the particles with mass).
+        accel = direct_accelerations(self.verts_coord[index], self.verts_coord, self.verts_mass, self.G,
+                                     memory_cap=self.particle_memory_cap, workspace=self.workspace)[0]
+        if self.parts_mass is not None:
+            accel += self._particle_pull(self.verts_coord[index])
+        return accel
+
+    def _particle_accelerations_at(self, index):
+        #The gforce on only the indexed particles (and which of them have not collided with a body).
+        if self._grids is not None:
+            return self._grids.accelerations(self.parts_coord[index], self.parts_radius[index], self.verts_coord, self.verts_mass,
+                                             self.verts_radius, self.G)[:2]
+        if self.collision_detection == 'spatial_hash':
+            accel = direct_accelerations(self.parts_coord[index], self.verts_coord, self.verts_mass, self.G,
+                                         memory_cap=self.particle_memory_cap, workspace=self.workspace)[0]
+            uncollided = self._uncollided(self.parts_coord[index], self.parts_radius[index])
+        else:
+            accel, uncollided = direct_accelerations(self.parts_coord[index], self.verts_coord, self.verts_mass, self.G,
+                                                     target_radius=self.parts_radius[index], source_radius=self.verts_radius,
+                                                     memory_cap=self.particle_memory_cap, workspace=self.workspace)
+        if self.parts_mass is not None:
+            accel += self._particle_self_gravity(self.parts_coord)[index]
+        return accel, uncollided
+
+    def _body_jerks_at(self, index):
+        #The rate of change of the gforce on the indexed bodies.
+        return direct_jerks(self.verts_coord[index], self.verts_vel[index], self.verts_coord, self.verts_vel, self.verts_mass,
+                            self.G, memory_cap=self.particle_memory_cap, workspace=self.workspace)
+
+    def _particle_jerks_at(self, index):
+        #(only the bodies count towards the particles' jerk, the particles' pull on each other is left out)
+        return direct_jerks(self.parts_coord[index], self.parts_vel[index], self.verts_coord, self.verts_vel, self.verts_mass,
+                            self.G, memory_cap=self.particle_memory_cap, workspace=self.workspace)
+
+    def _particle_self_gravity(self, coord):
+        #The gforce the particles put on each other (collided particles have no mass left and are left out).
+        live = np.flatnonzero(self.parts_mass)
+        accel = np.zeros_like(coord)
+        if live.shape[0] == 0:
+            return accel
+
+        if self.particle_solver == 'particle_mesh':
+            if self._mesh is None or self._mesh.mesh_size != self.mesh_size:
+                self._mesh = ParticleMesh(self.mesh_size)
+            accel[live] = self._mesh.accelerations(coord[live], self.parts_mass[live], self.G)
+        else:
+            accel[live] = direct_accelerations(coord[live], coord[live], self.parts_mass[live], self.G,
+                                               memory_cap=self.particle_memory_cap)[0]
+        return accel
+
+    def _particle_pull(self, coord, parts_coord=None):
+        #The gforce the particles with mass (at parts_coord, their current positions by default) put on bodies at coord,
+        #the other half of the bodies' pull on them so the momentum of the bodies and the particles together is kept.
+        parts_coord = self.parts_coord if parts_coord is None else parts_coord
+        live = np.flatnonzero(self.parts_mass) #(collided particles have no mass left)
+        if live.shape[0] == 0:
+            return np.zeros_like(coord)
+        return direct_accelerations(coord, parts_coord[live], self.parts_mass[live], self.G, memory_cap=self.particle_memory_cap)[0]
 
     def _update_nonvectorized(self, t):
         #This is the non-vectorized version of _update_vectorized and is here to simply demonstrate the concept.
         ax0, ax1, ax2 = 0, 1, 2  # allows the ability to select which axes (plane) we want to use (basically X=0,Y=1 or Y=1,Z=2 and so on..)
+        gforce = np.zeros((self.verts_coord.shape[0], 3), dtype=np.float64) #every body's pull from where they all are at the start of the step
 
         for i, pt in enumerate(self.verts_coord):
             loc = self.verts_coord[i] #* self.TimeScale
@@ -215,8 +798,11 @@ class newtonianLawOfGravitation():
 
                 axis_g += np.array([g_x, g_y, g_z])
 
-            self.verts_coord[i] += axis_g * t
-            self.verts_coord[i] += self.verts_coord[i] * t
+            gforce[i] = axis_g
+
+        #now apply the gforce vectors to the actual coordinate's positions and velocities (the same kick then drift as _update_vectorized)
+        self.verts_vel += gforce * t
+        self.verts_coord += self.verts_vel * t
 
         return self.verts_coord
 
@@ -1,215 +1,317 @@
 #! /usr/bin/python
 
 #--------------------------------#
-# Physics example running in an openGL PyQtGraph Scatterplot.
+# Tensorflow version of the gravity engine, the bodies are stepped by a Tensorflow graph.
 # Demonstrates Newton's law of gravitation in a planetary orbit simulator.
 #--------------------------------#
 
-import sys
-import time
 import numpy as np
-from datetime import timedelta
 
 import tensorflow as tf
+if hasattr(tf, 'compat') and hasattr(tf.compat, 'v1'): #the graph and session api (only found under compat.v1 in tensorflow 2)
+    tf = tf.compat.v1
 
-from pyqtgraph.Qt import QtCore, QtGui
-import pyqtgraph.opengl as gl
+from .gravity_vectorized import newtonianLawOfGravitation
+from .integrators import get_integrator
+from .particle_pool import ParticlePool
+from .collisions import nearest_bodies
 
 
-class newtonianLawOfGravitation():
-    builder = None #the builder object for the scene actor
+class tensorflowGravitation(newtonianLawOfGravitation):
+    #The graph is built once per body and particle count and kept across resets (the variables are just reloaded),
+    #and every sess.run does steps_per_call integration steps (of the engine's integrator) inside an in-graph while loop.
+    #The particles live in the graph as well, in fixed capacity variables where collided particles are only
+    #flagged dead in an alive mask, so only the coordinates for drawing come back to the host each frame
+    #(the host's parts_vel and parts_radius keep their starting values, the graph owns the live ones).
+    steps_per_call = 1 #integration steps run in the graph for each update() (each one a fraction of the frame's time step)
+    use_xla = False #compile the graph with XLA
+    graph_integrators = ('euler', 'leapfrog', 'yoshida4', 'yoshida6') #the integrators built into the graph (the plain compositions)
 
-    verts_coord = None #vertex coordinates
-    verts_color = None
-    verts_radius = None
+    compact_every = 100 #updates between checks for dead particles to compact away
+    compact_fraction = 0.1 #compact once this fraction of the processed particle rows are dead
 
-    parts_coord = None #particle coordinates
-    parts_color = None
-    parts_radius = None
-
-    sess = None
-
-    size_scale = 1 * 10 ** 8 #defaults to 1 million kilometers per unit
-    time_scale = 1 #defaults to 1 but can be adjusted with slider control
-
-    G = 6.674 * 10 ** -11  # Newton meters^2/kg^2
-
-    def __init__(self, builder):
-        self._builder = builder
-        self.sess = tf.Session()
-        self.__reset_universe__()
-
-        self.sess.run(tf.global_variables_initializer())
-
-    def update(self):
-        t = 0.01 * self.time_scale #The time step scale value
-        self.simTotalTime += t # second
-
-        self.verts_coord = self._update_tensorflow(t)
-        if self.builder.parts_coord is not None:
-            particles = self._particle_vectorized(t)
-            vretices = np.append(self.verts_coord, particles, axis=0) / self.size_scale
-            colors = self.colors = np.append(self.verts_color, self.parts_color, axis=0)
-            return vretices, colors
-        else:
-            vretices = self.verts_coord / self.size_scale
-            colors = self.verts_color
-            return vretices, colors
-
-
-    def __reset_timers__(self):
-        self.simStartTime = time.time()
-        self.simLastTime = self.simStartTime
-        self.simTotalTime = 0
+    graph = None
+    parts_alive = None
+    _graph_layout = None
 
     def __reset_universe__(self):
-        self.__load_builder__()
-        self.__reset_timers__()
+        super(tensorflowGravitation, self).__reset_universe__()
+        self.parts_alive = None
         self.__init_tensorflow_graph()
 
-    def __load_builder__(self):
-        self.builder = self._builder(self.size_scale)
+    def _step(self, t):
+        self._substeps(t, 1)
+
+    def _substeps(self, t, k):
+        if self._graph_layout[2] != self.integrator: #the integrator is part of the graph, rebuild it around the current state
+            self._pull_state()
+            self.__init_tensorflow_graph()
+        #all k steps are run by the graph's loop in one call (unless the particles are stepped by numpy in between)
+        batches = [k] if self.parts_coord is None or self._graph_particles else [1] * k
+        start = self.simTotalTime - (k * t if self.physics_step is None else 0) #(only a frame's single step is counted in before it is taken)
+        for n in batches:
+            start += n * t
+            self._event_time = start #(collisions in a batch of steps are stamped with the batch's end)
+            if self.parts_mass is not None: #(particles with mass pull on the bodies from the numpy path, so the bodies are stepped there with them)
+                super(tensorflowGravitation, self)._step(t)
+                continue
+            self.verts_coord = self._update_tensorflow(t / self.steps_per_call, n * self.steps_per_call)
+            if self.parts_coord is not None:
+                self.parts_coord = self._particle_vectorized(t)
+            self._merge_bodies()
+
+    def _merge_bodies(self):
+        #the body variables are sized to the body count, so a merger reloads the graph around the merged bodies
+        if not super(tensorflowGravitation, self)._merge_bodies():
+            return False
+        self._pull_state()
+        self.__init_tensorflow_graph()
+        return True
 
-        self.verts_coord  = self.builder.verts_coord
-        self.verts_radius = self.builder.verts_radius
-        self.verts_color  = self.builder.verts_color
-        self.verts_vel    = self.builder.verts_vel
-        self.verts_mass   = self.builder.verts_mass
+    def _kepler_hosts(self, coord):
+        return None #(the graph steps every particle, there are no Kepler orbits here)
 
-        if self.builder.parts_coord is not None:
-            epsilon = 0.000001 #helps avoid divide by zero errors on first cycle
-            self.parts_coord  = (self.builder.parts_coord + epsilon)
-            self.parts_radius = self.builder.parts_radius
-            self.parts_color  = self.builder.parts_color
-            self.parts_vel    = self.builder.parts_vel
+    def _update_vectorized(self, t):
+        return self._update_tensorflow(t / self.steps_per_call, self.steps_per_call)
 
+    def _particle_vectorized(self, t):
+        #the particles were already stepped in the graph along with the bodies, only the colors are left to do
+        self.parts_color[~self.parts_alive] *= 0
+        return self.parts_coord
 
     def __init_tensorflow_graph(self):
+        n = self.verts_coord.shape[0]
+        #particles with mass also pull on each other which stays on the numpy path
+        self._graph_particles = self.parts_coord is not None and self.parts_mass is None
+        p = self.parts_coord.shape[0] if self._graph_particles else 0
+        if self.graph is None or self._graph_layout != (n, p, self.integrator, np.dtype(self.dtype)):
+            self.__build_tensorflow_graph(n, p)
+
+        #a reset only has to load the new starting values into the variables
+        feed = {self.load_coord: self.verts_coord, self.load_vel: self.verts_vel, self.load_mass: self.verts_mass,
+                self.load_radius: self.verts_radius}
+        if self._graph_particles:
+            if self.parts_alive is None or self.parts_alive.shape[0] != p:
+                self.parts_alive = np.ones(p, dtype=bool)
+            feed.update({self.load_parts_coord: self.parts_coord, self.load_parts_vel: self.parts_vel,
+                         self.load_parts_radius: self.parts_radius, self.load_parts_alive: self.parts_alive})
+        self.sess.run(self.load_op, feed_dict=feed)
+        self._updates = 0
+
+    def _pull_state(self):
+        #Copy the particles' state out of the graph into the host arrays.
+        if self._graph_particles:
+            self.parts_coord, self.parts_vel, self.parts_radius, self.parts_alive = self.sess.run(
+                [self.parts_coord_var, self.parts_vel_var, self.parts_radius_var, self.parts_alive_var])
+
+    def __build_tensorflow_graph(self, n, p):
+        if self.integrator not in self.graph_integrators:
+            raise ValueError("The tensorflow backend does not implement the '%s' integrator, choose one of %s or another backend" % (
+                self.integrator, ', '.join(self.graph_integrators)))
         if self.sess is not None:
             self.sess.close()
-        self.sess = tf.Session()
-
-        def atan2_tensor(y, x):
-            angle = tf.where(tf.greater(x, 0.0), tf.atan(y / x), tf.zeros_like(x))
-            angle = tf.where(tf.logical_and(tf.less(x, 0.0), tf.greater_equal(y, 0.0)), tf.atan(y / x) + np.pi, angle)
-            angle = tf.where(tf.logical_and(tf.less(x, 0.0), tf.less(y, 0.0)), tf.atan(y / x) - np.pi, angle)
-            angle = tf.where(tf.logical_and(tf.equal(x, 0.0), tf.greater(y, 0.0)), 0.5 * np.pi * tf.ones_like(x), angle)
-            angle = tf.where(tf.logical_and(tf.equal(x, 0.0), tf.less(y, 0.0)), -0.5 * np.pi * tf.ones_like(x), angle)
-            angle = tf.where(tf.logical_and(tf.equal(x, 0.0), tf.equal(y, 0.0)), tf.zeros_like(x), angle)
-            return angle
-
-        ax0, ax1, ax2 = 0, 1, 2
-
-        self.ts = tf.placeholder(tf.float64, shape=())
-
-        self.tensor_coord = tf.Variable(self.verts_coord, dtype=tf.float64)
-        self.vel = tf.Variable(self.verts_vel, dtype=tf.float64)
-        mass = tf.Variable(self.verts_mass, dtype=tf.float64)
-
-        n = self.tensor_coord .get_shape()[0].value
-        eye = ~np.eye(n, dtype=bool)
-
-        tile = tf.tile(self.tensor_coord, [n, 1])
-        tile = tf.reshape(tile, [n, n, -1])
-
-        mask = tf.constant(eye)
-        loc = tf.boolean_mask(tile, mask)
-        loc = tf.reshape(loc, [n, n - 1, 3])
-
-        rep = tf.tile(self.tensor_coord, [1, n - 1])
-        rep = tf.reshape(rep, [n, n - 1, 3])
-
-        slope = tf.subtract(loc, rep)  # rise and run -or- delta positions
-        d_z = slope[:, ::, ax2:ax2 + 1]  # delta height
-        d_y = slope[:, ::, ax1:ax1 + 1]  # rise / delta Y
-        d_x = slope[:, ::, ax0:ax0 + 1]  # run / delta X
-
-        base = tf.sqrt(tf.add(tf.pow(d_x, 2), tf.pow(d_y, 2)))  # the "base" lenght of the triangle which describes the change in z
-        hyp = tf.sqrt(tf.add(tf.pow(base, 2), tf.pow(d_z, 2)))
-        #hyp = tf.multiply(hyp, self.size_scale)  # the actual "radius" length from the base vertex "verts_coord[i]" to all other vertexes
-
-        az_tan = atan2_tensor(d_y, d_x)  # radians on the x,y plane formed from our base vertex to the other vertex
-        elv_tan = atan2_tensor(d_z,base)  # elevation radians -or- the angle formed from the base triangle to the tip of the gforce vector
-
-        space = tf.pow(hyp, 2)
-        force = tf.multiply(mass, self.G)
-
-        g = tf.transpose(tf.divide(force, tf.transpose(space)))
-
-        base2 = tf.multiply(g, tf.cos(elv_tan))  # a vector residing only on the x,y plane denoting the base length of the gforce vector triangle
-
-        g_x = tf.multiply(base2, tf.cos(az_tan))
-        g_y = tf.multiply(base2, tf.sin(az_tan))
-        g_z = tf.multiply(g, tf.sin(elv_tan))  # the height (from a point rotating around the x,y plane this vector goes straight up z and is connected to the tip of gforce vector)
-
-        sort = tf.constant(np.nonzero(eye)[1].argsort())
-        g_x = tf.reshape(tf.gather(tf.reshape(g_x, [-1]), sort), g_x.get_shape())
-        g_y = tf.reshape(tf.gather(tf.reshape(g_y, [-1]), sort), g_y.get_shape())
-        g_z = tf.reshape(tf.gather(tf.reshape(g_z, [-1]), sort), g_z.get_shape())
-
-        g_x = tf.reduce_sum(g_x, 1)
-        g_y = tf.reduce_sum(g_y, 1)
-        g_z = tf.reduce_sum(g_z, 1)
-
-        axis_gforce = tf.stack([g_x, g_y, g_z], 2)[:, 0]
-
-        # now apply the gforce vectors to the actual coordinate's positions and velocities
-        self.vel = tf.assign(self.vel, tf.add(self.vel, tf.multiply(axis_gforce, self.ts)))
-        self.tensor_coord = tf.assign(self.tensor_coord, tf.subtract(self.tensor_coord, tf.multiply(self.vel, self.ts)))
-
-        self.sess.run(tf.global_variables_initializer())
-
-    def _update_tensorflow(self, t):
-        return self.sess.run(self.tensor_coord, feed_dict={self.ts: t})
-
-
-    def _particle_vectorized(self, t):
-        #todo someday this may also be done using Tensorflow
-        ax0, ax1, ax2 = 0, 1, 2  # allows the ability to select which axes (plane) we want to use (basically X=0,Y=1 or Y=1,Z=2 and so on..)
-
-        loc = np.tile(self.verts_coord, (self.parts_coord.shape[0], 1, 1))
-
-        i2 = self.verts_coord.shape[0]
-        repeater = np.repeat(self.parts_coord, i2, axis=0).reshape(loc.shape[0], i2, 3) #the mat for each particle to calc against each vert
-
-        mat_slope = loc - repeater # rise and run -or- delta positions
-
-        mat_d_z = mat_slope[:,::,ax2:ax2+1] # delta height
-        mat_d_y = mat_slope[:,::,ax1:ax1+1] # rise / delta Y
-        mat_d_x = mat_slope[:,::,ax0:ax0+1] # run / delta X
-
-        mat_base = np.sqrt(mat_d_x ** 2 + mat_d_y ** 2) # the "base" lenght of the triangle which describes the change in z
-        mat_hyp = np.sqrt(mat_base ** 2 + mat_d_z ** 2) # the actual "radius" length from the base vertex "verts_coord[i]" to all other vertexes
-
-        mat_az_tan = np.arctan2(mat_d_y, mat_d_x)  # radians on the x,y plane formed from our base vertex to the other vertex
-        mat_elv_tan = np.arctan2(mat_d_z, mat_base) # elevation radians -or- the angle formed from the base triangle to the tip of the gforce vector
-
-        space = mat_hyp ** 2
-        force = self.G * self.verts_mass
-        force = np.tile(force, space.shape[0]).reshape(space.shape) #prepare for opperaton on all mat_space rows
-
-        mat_g = force / space #Newton's gravity equation
-        mat_base2 = mat_g * np.cos(mat_elv_tan) #a vector residing only on the x,y plane denoting the base length of the gforce vector triangle
-
-        mat_g_x = mat_base2 * np.cos(mat_az_tan)
-        mat_g_y = mat_base2 * np.sin(mat_az_tan)
-        mat_g_z = mat_g * np.sin(mat_elv_tan)  # the height (from a point rotating around the x,y plane this vector goes straight up z and is connected to the tip of gforce vector)
-
-        mat_axis_gforce = np.sum(np.dstack((mat_g_x, mat_g_y, mat_g_z)), axis=1)
-
-        self.parts_vel += mat_axis_gforce * t
-        self.parts_coord += self.parts_vel * t
-
-        #now do collision detection and keep only particles that have not collided with any bodies
-        collisions = mat_hyp - self.verts_radius.reshape(self.verts_radius.shape[0],1) #subtract the particles's coord from the distance to the body
-        collisions = np.prod(collisions, axis=1) #get product for each particle's rows (if there are zeros anywhere then result will be zero)
-        collisions = np.prod(collisions, axis=1).clip(0).nonzero() #get only the indexes of the verts that are not zero as the indices to keep
-
-        self.parts_coord = self.parts_coord[collisions]
-        self.parts_color = self.parts_color[collisions]
-        self.parts_radius = self.parts_radius[collisions]
-        self.parts_vel = self.parts_vel[collisions]
-
-        return self.parts_coord
 
+        weights = get_integrator(self.integrator)
+        ftype = tf.as_dtype(np.dtype(self.dtype)) #(the graph runs in the engine's precision)
+        self.graph = tf.Graph()
+        self._graph_layout = (n, p, self.integrator, np.dtype(self.dtype))
+        with self.graph.as_default():
+            self.ts = tf.placeholder(ftype, shape=())
+            self.n_steps = tf.placeholder(tf.int32, shape=())
+
+            self.tensor_coord = tf.Variable(np.zeros((n, 3)), dtype=ftype)
+            self.vel = tf.Variable(np.zeros((n, 3)), dtype=ftype)
+            mass = tf.Variable(np.zeros(n), dtype=ftype)
+            radius = tf.Variable(np.zeros(n), dtype=ftype)
+
+            self.load_coord = tf.placeholder(ftype, shape=(n, 3))
+            self.load_vel = tf.placeholder(ftype, shape=(n, 3))
+            self.load_mass = tf.placeholder(ftype, shape=(n,))
+            self.load_radius = tf.placeholder(ftype, shape=(n,))
+            loads = [tf.assign(self.tensor_coord, self.load_coord), tf.assign(self.vel, self.load_vel),
+                     tf.assign(mass, self.load_mass), tf.assign(radius, self.load_radius)]
+
+            force = tf.multiply(mass, self.G)[None, :]
+
+            def accelerations(target, coord):
+                slope = coord[None, :, :] - target[:, None, :] # delta positions pointing from the target towards body j
+                space = tf.reduce_sum(tf.square(slope), axis=2)
+                inv_hyp = tf.where(space > 0, tf.rsqrt(tf.maximum(space, 1e-300)), tf.zeros_like(space)) #no force from a body onto itself
+                g = force * inv_hyp * inv_hyp * inv_hyp
+                return tf.reduce_sum(g[:, :, None] * slope, axis=1), space
+
+            def particle_accelerations(coord, parts_coord, parts_radius):
+                #the gforce on the particles and whether they are clear of every body
+                accel, space = accelerations(parts_coord, coord)
+                reach = radius[None, :] + parts_radius[:, None]
+                return accel, tf.reduce_all(space > reach * reach, axis=1)
+
+            def remove_particles(parts_coord, parts_vel, parts_radius, alive):
+                #collided particles are put very far away and out of sight and stop being moved
+                parts_coord = tf.where(alive, parts_coord, tf.fill(tf.shape(parts_coord), tf.constant(self.far, ftype)))
+                parts_vel = tf.where(alive, parts_vel, tf.zeros_like(parts_vel))
+                parts_radius = tf.where(alive, parts_radius, tf.zeros_like(parts_radius))
+                return parts_coord, parts_vel, parts_radius, alive
+
+            def euler_step(i, coord, vel, *parts):
+                # now apply the gforce vectors to the actual coordinate's positions and velocities
+                vel = vel + accelerations(coord, coord)[0] * self.ts
+                coord = coord + vel * self.ts
+                if parts:
+                    parts_coord, parts_vel, parts_radius, alive = parts
+                    accel, clear = particle_accelerations(coord, parts_coord, parts_radius)
+                    parts_vel = parts_vel + accel * self.ts
+                    parts_coord = parts_coord + parts_vel * self.ts
+                    parts = remove_particles(parts_coord, parts_vel, parts_radius, tf.logical_and(alive, clear))
+                return (i + 1, coord, vel) + tuple(parts)
+
+            def composed_step(i, coord, vel, accel, *parts):
+                #the integrator's kick-drift-kick substeps (see integrators.py), the accelerations carry over to the next step
+                if parts:
+                    parts_coord, parts_vel, parts_radius, alive, parts_accel = parts
+                for w in weights:
+                    h = w * self.ts
+                    vel = vel + accel * (h / 2)
+                    coord = coord + vel * h
+                    accel = accelerations(coord, coord)[0]
+                    vel = vel + accel * (h / 2)
+                    if parts:
+                        parts_vel = parts_vel + parts_accel * (h / 2)
+                        parts_coord = parts_coord + parts_vel * h
+                        parts_accel, clear = particle_accelerations(coord, parts_coord, parts_radius)
+                        parts_vel = parts_vel + parts_accel * (h / 2)
+                        alive = tf.logical_and(alive, clear)
+                if parts:
+                    parts = remove_particles(parts_coord, parts_vel, parts_radius, alive)
+                    parts += (tf.where(alive, parts_accel, tf.zeros_like(parts_accel)),)
+                return (i + 1, coord, vel, accel) + tuple(parts)
+
+            coord, vel = self.tensor_coord.read_value(), self.vel.read_value()
+            loop_vars = [tf.constant(0), coord, vel]
+            if weights is not None:
+                loop_vars.append(accelerations(coord, coord)[0])
+            n_body_vars = len(loop_vars)
+            if p:
+                self.__build_particle_variables(p, loads, ftype)
+
+                #only the leading live rows are stepped (compaction moves the dead particles behind them)
+                live = self.parts_live
+                parts = [self.parts_coord_var[:live], self.parts_vel_var[:live], self.parts_radius_var[:live],
+                         self.parts_alive_var[:live]]
+                if weights is not None:
+                    parts.append(particle_accelerations(coord, parts[0], parts[2])[0])
+                loop_vars += parts
+
+            out = tf.while_loop(lambda i, *state: i < self.n_steps, euler_step if weights is None else composed_step, loop_vars)
+            stores = [tf.assign(self.tensor_coord, out[1]), tf.assign(self.vel, out[2])]
+            if p:
+                parts = out[n_body_vars:]
+                stores += [self.parts_coord_var[:live].assign(parts[0]), self.parts_vel_var[:live].assign(parts[1]),
+                           self.parts_radius_var[:live].assign(parts[2]), self.parts_alive_var[:live].assign(parts[3])]
+            with tf.control_dependencies(stores):
+                self.step_coord = tf.identity(out[1])
+                self.step_vel = tf.identity(out[2])
+                if p:
+                    self.step_parts_coord = tf.identity(self.parts_coord_var)
+                    self.step_parts_alive = tf.identity(self.parts_alive_var)
+
+            self.load_op = tf.group(*loads)
+            self.shift = tf.placeholder(ftype, shape=(3,))
+            shifts = [tf.assign(self.tensor_coord, self.tensor_coord - self.shift[None, :])]
+            if p:
+                shifts.append(tf.assign(self.parts_coord_var, self.parts_coord_var - self.shift[None, :]))
+            self.rebase_op = tf.group(*shifts)
+            init = tf.global_variables_initializer()
+
+        config = tf.ConfigProto()
+        if self.use_xla:
+            config.graph_options.optimizer_options.global_jit_level = tf.OptimizerOptions.ON_1
+        self.sess = tf.Session(graph=self.graph, config=config)
+        self.sess.run(init)
+
+    def __build_particle_variables(self, p, loads, ftype):
+        self.parts_coord_var = tf.Variable(np.zeros((p, 3)), dtype=ftype)
+        self.parts_vel_var = tf.Variable(np.zeros((p, 3)), dtype=ftype)
+        self.parts_radius_var = tf.Variable(np.zeros(p), dtype=ftype)
+        self.parts_alive_var = tf.Variable(np.ones(p, dtype=bool), dtype=tf.bool)
+        self.parts_live = tf.Variable(p, dtype=tf.int32) #rows at the front that may still hold live particles
+
+        self.load_parts_coord = tf.placeholder(ftype, shape=(p, 3))
+        self.load_parts_vel = tf.placeholder(ftype, shape=(p, 3))
+        self.load_parts_radius = tf.placeholder(ftype, shape=(p,))
+        self.load_parts_alive = tf.placeholder(tf.bool, shape=(p,))
+        loads += [tf.assign(self.parts_coord_var, self.load_parts_coord), tf.assign(self.parts_vel_var, self.load_parts_vel),
+                  tf.assign(self.parts_radius_var, self.load_parts_radius), tf.assign(self.parts_alive_var, self.load_parts_alive),
+                  tf.assign(self.parts_live, p)]
+
+        #compaction keeps the capacity but stably moves the live particles to the front so the step can skip the rest
+        order = tf.argsort(tf.cast(tf.logical_not(self.parts_alive_var), tf.int32), stable=True)
+        compact = [tf.assign(var, tf.gather(var, order)) for var in
+                   (self.parts_coord_var, self.parts_vel_var, self.parts_radius_var, self.parts_alive_var)]
+        compact.append(tf.assign(self.parts_live, tf.reduce_sum(tf.cast(self.parts_alive_var, tf.int32))))
+        with tf.control_dependencies(compact):
+            self.compact_order = tf.identity(order)
+
+    def _rebase(self, shift):
+        #the graph holds the coordinates between calls, so they are moved in there as well as on the host
+        super(tensorflowGravitation, self)._rebase(shift)
+        self.sess.run(self.rebase_op, feed_dict={self.shift: shift})
+
+    def _update_tensorflow(self, t, steps=1):
+        #Run the given number of steps in the graph and bring the new coordinates back (and the velocities of the bodies).
+        feed = {self.ts: t, self.n_steps: steps}
+        if not self._graph_particles:
+            self.verts_coord, self.verts_vel = self.sess.run([self.step_coord, self.step_vel], feed_dict=feed)
+            return self.verts_coord
+
+        before, was_alive = self.parts_coord, self.parts_alive
+        self.verts_coord, self.verts_vel, self.parts_coord, self.parts_alive = self.sess.run(
+            [self.step_coord, self.step_vel, self.step_parts_coord, self.step_parts_alive], feed_dict=feed)
+        self._updates += 1
+
+        #the graph only flags the particles that hit a body, which body is found from where they were before the call
+        collided = np.flatnonzero(was_alive & ~self.parts_alive)
+        if collided.shape[0]:
+            self.collision_events.extend(zip(self.parts_id[collided].tolist(),
+                                             nearest_bodies(before[collided], self.parts_radius[collided], self.verts_coord, self.verts_radius).tolist(),
+                                             [self._event_time] * collided.shape[0]))
+        return self.verts_coord
+
+    def _compact_particles(self):
+        #Compact in the graph when enough of the stepped rows are dead (the host only reorders its colors to match).
+        #The graph keeps every row so the remap is a permutation, with -1 for the dead rows moved to the back.
+        if not self._graph_particles:
+            return super(tensorflowGravitation, self)._compact_particles()
+        if self._updates < self.compact_every:
+            return
+        self._updates = 0
+        live, alive = self.sess.run([self.parts_live, self.parts_alive_var])
+        if live - alive[:live].sum() <= self.compact_fraction * live:
+            return
+        order = self.sess.run(self.compact_order)
+        self.parts_coord = self.parts_coord[order]
+        self.parts_color = self.parts_color[order]
+        self.parts_id = self.parts_id[order]
+        self.parts_radius = self.parts_radius[order]
+        self.parts_alive = alive[order]
+        self.parts_remap = np.empty_like(order)
+        self.parts_remap[order] = np.arange(order.shape[0])
+        self.parts_remap[~alive] = -1
+        self.parts_generation += 1
+
+    def spawn_particles(self, coord, vel, radius, color, mass=None):
+        #The graph's particle variables are sized to the pool, so the new particles are added on the host
+        #(into a pool rebuilt from the graph's state) and the graph is reloaded around them.
+        self._pull_state()
+        if self._graph_particles:
+            self._parts_pool = ParticlePool(self._particle_arrays(), alive=self.parts_alive)
+        rows = super(tensorflowGravitation, self).spawn_particles(coord, vel, radius, color, mass)
+        self.parts_alive = self._parts_pool.alive[:self._parts_pool.live].copy()
+        self.__init_tensorflow_graph()
+        return rows
 
+    def close(self):
+        if self.sess is not None:
+            self.sess.close()
+            self.sess = None
+        self.graph = None
@@ -0,0 +1,307 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Symplectic integrators shared by every physics backend.
+# "euler" is the engines' own semi-implicit euler step (kick then drift, the fused kernels of each backend).
+# The others are compositions of kick-drift-kick leapfrog substeps of weight w (Yoshida 1990), which keep the
+# energy error bounded instead of drifting so a much larger time step gives the same orbits.
+# Only the engine's _evaluate_forces, _kick and _drift are used so any backend's force kernels plug straight in.
+# "block" is kick-drift-kick leapfrog with individual power of two time steps, every body and particle picks its level
+# from its own acceleration and jerk and only the ones finishing a step have their forces recomputed.
+# "wisdom_holman" is for scenes ruled by one central mass, every other body and particle follows its analytic
+# Kepler orbit around it and the pulls between them are only applied as kicks at the ends of each step.
+# "hermite" is the 4th order Hermite predictor-corrector with the gforce and its jerk from one pass and an adaptive
+# shared step from Aarseth's criterion, for close encounters between the bodies.
+#--------------------------------#
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .direct import direct_accelerations
+from .kepler import kepler_drift
+
+def _yoshida4():
+    cbrt2 = 2 ** (1 / 3.)
+    w1 = 1 / (2 - cbrt2)
+    w0 = -cbrt2 / (2 - cbrt2)
+    return (w1, w0, w1)
+
+def _yoshida6():
+    #solution A of Yoshida's 6th order composition
+    w1, w2, w3 = -1.17767998417887, 0.235573213359357, 0.784513610477560
+    w0 = 1 - 2 * (w1 + w2 + w3)
+    return (w3, w2, w1, w0, w1, w2, w3)
+
+INTEGRATORS = OrderedDict([
+    ('euler', None), #1st order, one force evaluation per step
+    ('leapfrog', (1.0,)), #2nd order, one force evaluation per step (the last one is reused at the start of the next)
+    ('yoshida4', _yoshida4()), #4th order, three force evaluations per step
+    ('yoshida6', _yoshida6()), #6th order, seven force evaluations per step
+    ('block', (1.0,)), #2nd order leapfrog, but only the bodies and particles that need it take the smaller steps
+    ('wisdom_holman', (1.0,)), #2nd order in the (small) pulls between the orbiting bodies, the orbits themselves are exact
+    ('hermite', (1.0,)), #4th order, one force and jerk evaluation per (adaptive) step
+])
+
+def get_integrator(name):
+    #The leapfrog substep weights of the named integrator (None for euler).
+    if name not in INTEGRATORS:
+        raise KeyError("Unknown integrator '%s', choose one of: %s" % (name, ', '.join(INTEGRATORS)))
+    return INTEGRATORS[name]
+
+def integrate(gravity, t):
+    #Advance the engine's bodies and particles together by one step t using its integrator's composition.
+    if gravity.integrator == 'block':
+        return integrate_block(gravity, t)
+    if gravity.integrator == 'wisdom_holman':
+        return integrate_wisdom_holman(gravity, t)
+    if gravity.integrator == 'hermite':
+        return integrate_hermite(gravity, t)
+
+    forces = gravity._forces
+    if forces is None:
+        forces = gravity._evaluate_forces()
+
+    uncollided = forces[2]
+    for w in get_integrator(gravity.integrator):
+        h = w * t
+        gravity._kick(forces, h / 2)
+        gravity._drift(h)
+        forces = gravity._evaluate_forces()
+        gravity._kick(forces, h / 2)
+        if uncollided is not None:
+            uncollided = uncollided & forces[2]
+
+    gravity._forces = forces #the accelerations at the new positions start the next step
+    if uncollided is not None:
+        gravity._remove_particles(~uncollided)
+
+def _block_levels(gravity, t, accel, jerk, deepest=None):
+    #The level each wants from its own accuracy limit block_eta * |a| / |j| (the step at level k is t / 2**k), at most deepest.
+    a = np.sqrt(np.einsum('ij,ij->i', accel, accel))
+    j = np.sqrt(np.einsum('ij,ij->i', jerk, jerk))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        level = np.ceil(np.log2(t * j / (gravity.block_eta * a)))
+    level[~np.isfinite(level)] = 0 #(no force or no change in it, the whole step is fine)
+    return np.clip(level, 0, gravity.block_levels if deepest is None else deepest).astype(int)
+
+def _block_relevel(level, wanted, now, deepest):
+    #A step may always shrink, but may only grow by one level and only when the bigger step starts right now.
+    up = np.maximum(level - 1, 0)
+    synced = now % (2 ** (deepest - up)) == 0
+    return np.where(wanted >= level, wanted, np.where(synced, np.maximum(wanted, up), level))
+
+def integrate_block(gravity, t):
+    #Hierarchical block time steps: the frame's step t is the level 0 step and level k steps t / 2**k.
+    #Time is counted in ticks of the deepest level. Everything is drifted between the ticks where some step ends,
+    #a step's first half kick uses the accelerations from the end of its previous step, and the forces
+    #are only evaluated for (and the second half kick only given to) the ones whose step ends on that tick.
+    #The jerk is only computed directly for the first levels, after that the change in acceleration over the step is used.
+    deepest = gravity.block_levels
+    parts_deepest = min(gravity.block_particle_levels, deepest)
+    ticks = 2 ** deepest
+    tick = t / ticks
+    has_parts = gravity.parts_coord is not None
+
+    state = gravity._block
+    if state is None:
+        every = np.arange(gravity.verts_coord.shape[0])
+        state = gravity._block = {'accel': gravity._body_accelerations_at(every)}
+        state['level'] = _block_levels(gravity, t, state['accel'], gravity._body_jerks_at(every))
+        if has_parts:
+            every = np.arange(gravity.parts_coord.shape[0])
+            state['parts_accel'] = gravity._particle_accelerations_at(every)[0]
+            state['parts_level'] = _block_levels(gravity, t, state['parts_accel'], gravity._particle_jerks_at(every), parts_deepest)
+
+    now = 0
+    while now < ticks:
+        #first half kick for everyone starting a step on this tick
+        size = 2 ** (deepest - state['level'])
+        start = now % size == 0
+        gravity.verts_vel[start] += state['accel'][start] * (size[start] * tick / 2)[:, None]
+        if has_parts:
+            parts_size = 2 ** (deepest - state['parts_level'])
+            parts_start = now % parts_size == 0
+            gravity.parts_vel[parts_start] += state['parts_accel'][parts_start] * (parts_size[parts_start] * tick / 2)[:, None]
+
+        #drift everything up to the next tick where some step ends
+        finest = size.min() if not has_parts else min(size.min(), parts_size.min())
+        step = finest - now % finest
+        gravity.verts_coord += gravity.verts_vel * (step * tick)
+        if has_parts:
+            gravity.parts_coord += gravity.parts_vel * (step * tick)
+        now += step
+
+        #new forces and the second half kick for the ones whose step ends here, then their next level
+        end = np.flatnonzero(now % size == 0)
+        if end.shape[0]:
+            dt = (size[end] * tick)[:, None]
+            accel = gravity._body_accelerations_at(end)
+            jerk = (accel - state['accel'][end]) / dt #(the change over the step is close enough for picking a level)
+            state['accel'][end] = accel
+            gravity.verts_vel[end] += accel * (dt / 2)
+            state['level'][end] = _block_relevel(state['level'][end], _block_levels(gravity, t, accel, jerk), now, deepest)
+
+        if has_parts:
+            end = np.flatnonzero(now % parts_size == 0)
+            if end.shape[0]:
+                dt = (parts_size[end] * tick)[:, None]
+                accel, uncollided = gravity._particle_accelerations_at(end)
+                jerk = (accel - state['parts_accel'][end]) / dt
+                state['parts_accel'][end] = accel
+                gravity.parts_vel[end] += accel * (dt / 2)
+                wanted = _block_levels(gravity, t, accel, jerk, parts_deepest)
+                state['parts_level'][end] = _block_relevel(state['parts_level'][end], wanted, now, deepest)
+                gravity._remove_particles(end[~uncollided])
+
+def integrate_wisdom_holman(gravity, t):
+    #Wisdom-Holman map in democratic heliocentric coordinates (positions relative to the most massive body,
+    #velocities relative to the center of mass): half kick from the pulls between the orbiting bodies, half of the
+    #center of mass shift, Kepler orbits around the central mass for the whole step, the other half shift and half kick.
+    #Particles are massless passengers that follow the same steps (and are removed on touching any body).
+    #A satellite like the Moon is only pulled by the Earth through the kicks so it still needs steps short against its orbit.
+    G = gravity.G
+    mass = gravity.verts_mass.astype(np.float64) #(the heliocentric sums and the kepler solve run in double precision whatever the engine's)
+    star = np.argmax(mass)
+    others = np.flatnonzero(np.arange(mass.shape[0]) != star)
+    m = mass[others]
+    star_mass, total_mass = mass[star], mass.sum()
+    mu = G * star_mass
+    has_parts = gravity.parts_coord is not None
+
+    coord, vel = gravity.verts_coord, gravity.verts_vel
+    center = np.dot(mass, coord) / total_mass
+    center_vel = np.dot(mass, vel) / total_mass
+    q = (coord[others] - coord[star]).astype(np.float64)
+    v = vel[others] - center_vel
+    if has_parts:
+        parts_q = (gravity.parts_coord - coord[star]).astype(np.float64)
+        parts_v = gravity.parts_vel - center_vel
+        uncollided = np.ones(parts_q.shape[0], dtype=bool)
+
+    def kick(h):
+        v[...] += direct_accelerations(q, q, m, G)[0] * h
+        if has_parts and gravity.parts_mass is not None:
+            v[...] += gravity._particle_pull(q, parts_q) * h
+        if has_parts:
+            accel, clear = direct_accelerations(parts_q, q, m, G, target_radius=gravity.parts_radius,
+                                                source_radius=gravity.verts_radius[others], memory_cap=gravity.particle_memory_cap)
+            if gravity.parts_mass is not None:
+                accel += gravity._particle_self_gravity(parts_q)
+            parts_v[...] += accel * h
+            uncollided[...] &= clear
+
+    def shift(h):
+        jump = np.dot(m, v) / star_mass * h
+        q[...] += jump
+        if has_parts:
+            parts_q[...] += jump
+
+    kick(t / 2)
+    shift(t / 2)
+    q[...], v[...] = kepler_drift(q, v, mu, t)
+    if has_parts:
+        parts_q[...], parts_v[...] = kepler_drift(parts_q, parts_v, mu, t)
+    shift(t / 2)
+    kick(t / 2)
+
+    #back to the engine's coordinates (written in place so backends sharing the arrays see them)
+    center += center_vel * t
+    star_coord = center - np.dot(m, q) / total_mass
+    coord[star] = star_coord
+    coord[others] = q + star_coord
+    vel[star] = center_vel - np.dot(m, v) / star_mass
+    vel[others] = v + center_vel
+    if has_parts:
+        gravity.parts_coord[...] = parts_q + star_coord
+        gravity.parts_vel[...] = parts_v + center_vel
+        dist2 = np.einsum('ij,ij->i', parts_q, parts_q)
+        reach = gravity.verts_radius[star] + gravity.parts_radius
+        gravity._remove_particles(~(uncollided & (dist2 > reach * reach)))
+
+def _norm(v):
+    return np.sqrt(np.einsum('ij,ij->i', v, v))
+
+def _hermite_live(gravity):
+    #The live particle rows, the ones that take part in picking the step (None without particles).
+    if gravity.parts_coord is None:
+        return None
+    return gravity._parts_pool.alive[:gravity._parts_pool.live] if gravity._parts_pool is not None else slice(None)
+
+def _hermite_forces(gravity):
+    accel, jerk = gravity._body_accelerations_and_jerks(gravity.verts_coord, gravity.verts_vel)
+    if gravity.parts_coord is None:
+        return accel, jerk, None, None, None
+    if gravity.parts_mass is not None: #(the particles' pull on the bodies is left out of the jerk, like their pull on each other)
+        accel += gravity._particle_pull(gravity.verts_coord)
+    return (accel, jerk) + gravity._particle_accelerations_and_jerks(gravity.parts_coord, gravity.parts_vel)
+
+def integrate_hermite(gravity, t):
+    #Hermite steps of a shared adaptive size until the frame's step t is covered. Each step predicts the positions and
+    #velocities from the gforce and jerk, evaluates both again at the prediction and corrects with the two of them.
+    #The next step comes from Aarseth's criterion with the snap and crackle the correction implies, the smallest over the
+    #bodies and the live particles (a ring particle close to its planet needs much shorter steps than the planets do).
+    state = gravity._hermite
+    if state is None:
+        forces = _hermite_forces(gravity)
+        a, j = _norm(forces[0]), _norm(forces[1])
+        live = _hermite_live(gravity)
+        if live is not None:
+            a, j = np.r_[a, _norm(forces[2][live])], np.r_[j, _norm(forces[3][live])]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            first = gravity.hermite_eta * a / j
+        first = first[np.isfinite(first)]
+        state = gravity._hermite = {'forces': forces, 'dt': first.min() if first.shape[0] else t}
+
+    smallest = t / gravity.hermite_max_substeps
+    has_parts = gravity.parts_coord is not None
+    done = 0.
+    while done < t:
+        step = max(state['dt'], smallest)
+        dt = min(step, t - done)
+        accel, jerk, parts_accel, parts_jerk, _ = state['forces']
+
+        #predict (in place, so the forces are evaluated at the predicted state)
+        coord, vel = gravity.verts_coord.copy(), gravity.verts_vel.copy()
+        gravity.verts_coord += vel * dt + accel * (dt * dt / 2) + jerk * (dt * dt * dt / 6)
+        gravity.verts_vel += accel * dt + jerk * (dt * dt / 2)
+        if has_parts:
+            parts_coord, parts_vel = gravity.parts_coord.copy(), gravity.parts_vel.copy()
+            gravity.parts_coord += parts_vel * dt + parts_accel * (dt * dt / 2) + parts_jerk * (dt * dt * dt / 6)
+            gravity.parts_vel += parts_accel * dt + parts_jerk * (dt * dt / 2)
+
+        forces = _hermite_forces(gravity)
+        accel1, jerk1 = forces[0], forces[1]
+
+        #correct
+        gravity.verts_vel[...] = vel + (accel + accel1) * (dt / 2) + (jerk - jerk1) * (dt * dt / 12)
+        gravity.verts_coord[...] = coord + (vel + gravity.verts_vel) * (dt / 2) + (accel - accel1) * (dt * dt / 12)
+        if has_parts:
+            gravity.parts_vel[...] = parts_vel + (parts_accel + forces[2]) * (dt / 2) + (parts_jerk - forces[3]) * (dt * dt / 12)
+            gravity.parts_coord[...] = parts_coord + (parts_vel + gravity.parts_vel) * (dt / 2) + (parts_accel - forces[2]) * (dt * dt / 12)
+
+        #the next step from Aarseth's criterion sqrt(eta * (|a||a2| + |j|^2) / (|j||a3| + |a2|^2)) at the end of this one
+        crackle = (12 * (accel - accel1) + 6 * dt * (jerk + jerk1)) / (dt * dt * dt)
+        snap = (-6 * (accel - accel1) - dt * (4 * jerk + 2 * jerk1)) / (dt * dt) + dt * crackle
+        a, j, s, c = _norm(accel1), _norm(jerk1), _norm(snap), _norm(crackle)
+        if has_parts:
+            live = _hermite_live(gravity)
+            parts_accel1, parts_jerk1 = forces[2][live], forces[3][live]
+            parts_accel, parts_jerk = parts_accel[live], parts_jerk[live]
+            crackle = (12 * (parts_accel - parts_accel1) + 6 * dt * (parts_jerk + parts_jerk1)) / (dt * dt * dt)
+            snap = (-6 * (parts_accel - parts_accel1) - dt * (4 * parts_jerk + 2 * parts_jerk1)) / (dt * dt) + dt * crackle
+            a, j = np.r_[a, _norm(parts_accel1)], np.r_[j, _norm(parts_jerk1)]
+            s, c = np.r_[s, _norm(snap)], np.r_[c, _norm(crackle)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wanted = np.sqrt(gravity.hermite_eta * (a * s + j * j) / (j * c + s * s))
+        wanted = wanted[np.isfinite(wanted)]
+        state['dt'] = min(wanted.min(), 2 * step) if wanted.shape[0] else 2 * step #(growing at most twofold per step)
+
+        state['forces'] = forces
+        done += dt
+        if has_parts:
+            collided = ~forces[4]
+            if collided.any():
+                gravity._remove_particles(collided)
+                forces[2][collided] = 0
+                forces[3][collided] = 0
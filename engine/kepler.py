@@ -0,0 +1,85 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Analytic two body (Kepler) motion for many orbits at once.
+# Every orbit is advanced with the universal variable form of Kepler's equation so elliptic, parabolic and
+# hyperbolic orbits all take the same path through the code, solved with Laguerre-Conway iterations which
+# converge from the simple starting guess even for steps that span many orbits.
+#--------------------------------#
+
+import numpy as np
+
+def stumpff(z):
+    #The Stumpff functions C(z) and S(z) (with their series near zero where the closed forms lose their digits).
+    c = np.empty_like(z)
+    s = np.empty_like(z)
+    small = np.abs(z) < 1e-3
+    pos = (z > 0) & ~small
+    neg = (z < 0) & ~small
+
+    zs = z[small]
+    c[small] = 1 / 2. - zs / 24. + zs * zs / 720. - zs * zs * zs / 40320.
+    s[small] = 1 / 6. - zs / 120. + zs * zs / 5040. - zs * zs * zs / 362880.
+
+    sq = np.sqrt(z[pos])
+    c[pos] = (1 - np.cos(sq)) / z[pos]
+    s[pos] = (sq - np.sin(sq)) / (sq * sq * sq)
+
+    sq = np.sqrt(-z[neg])
+    c[neg] = (np.cosh(sq) - 1) / -z[neg]
+    s[neg] = (np.sinh(sq) - sq) / (sq * sq * sq)
+    return c, s
+
+def kepler_drift(coord, vel, mu, t, tolerance=1e-13, max_iterations=50):
+    #The positions and velocities after time t of points on Kepler orbits around a mass at the origin,
+    #mu is G times that mass (one value for all or one per point).
+    mu = np.broadcast_to(np.asarray(mu, dtype=coord.dtype), coord.shape[:1])
+    r0 = np.sqrt(np.einsum('ij,ij->i', coord, coord))
+    v2 = np.einsum('ij,ij->i', vel, vel)
+    rv = np.einsum('ij,ij->i', coord, vel)
+    sqrt_mu = np.sqrt(mu)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alpha = 2 / r0 - v2 / mu # one over the semi major axis (negative for hyperbolic orbits)
+        sigma = rv / sqrt_mu # (r0 . v0) / sqrt(mu)
+
+        #solve sigma*chi^2*C + (1 - alpha*r0)*chi^3*S + r0*chi = sqrt(mu)*t for the universal anomaly chi
+        chi = sqrt_mu * alpha * t
+        hyperbolic = alpha < 0 #(starting guess from Vallado, the elliptic one would be far too big)
+        semi = -1 / alpha[hyperbolic]
+        chi[hyperbolic] = np.sign(t) * np.sqrt(semi) * np.log(np.abs(-2 * mu[hyperbolic] * alpha[hyperbolic] * t / (
+            rv[hyperbolic] + np.sign(t) * np.sqrt(mu[hyperbolic] * semi) * (1 - r0[hyperbolic] * alpha[hyperbolic]))))
+        chi[~np.isfinite(chi)] = 0
+        todo = np.ones(chi.shape[0], dtype=bool)
+        for _ in range(max_iterations):
+            x = chi[todo]
+            a, r, sg = alpha[todo], r0[todo], sigma[todo]
+            z = a * x * x
+            c, s = stumpff(z)
+            f = sg * x * x * c + (1 - a * r) * x * x * x * s + r * x - sqrt_mu[todo] * t
+            df = sg * x * (1 - z * s) + (1 - a * r) * x * x * c + r
+            ddf = sg * (1 - z * c) + (1 - a * r) * x * (1 - z * s)
+            root = np.sqrt(np.abs(16 * df * df - 20 * f * ddf))
+            delta = 5 * f / (df + np.where(df < 0, -root, root))
+            delta[~np.isfinite(delta)] = 0
+            chi[todo] = x - delta
+            done = np.abs(delta) <= tolerance * np.maximum(np.abs(x), 1)
+            todo[np.flatnonzero(todo)[done]] = False
+            if not todo.any():
+                break
+
+        #the lagrange f and g coefficients carry the starting position and velocity to the new ones
+        z = alpha * chi * chi
+        c, s = stumpff(z)
+        f = 1 - chi * chi / r0 * c
+        g = t - chi * chi * chi * s / sqrt_mu
+        new_coord = f[:, None] * coord + g[:, None] * vel
+        r = np.sqrt(np.einsum('ij,ij->i', new_coord, new_coord))
+        df = sqrt_mu / (r * r0) * chi * (z * s - 1)
+        dg = 1 - chi * chi / r * c
+        new_vel = df[:, None] * coord + dg[:, None] * vel
+
+    #points sitting on the central mass (or without one) just coast
+    still = ~(np.isfinite(new_coord).all(axis=1) & np.isfinite(new_vel).all(axis=1))
+    new_coord[still] = coord[still] + vel[still] * t
+    new_vel[still] = vel[still]
+    return new_coord, new_vel
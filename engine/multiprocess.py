@@ -0,0 +1,172 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Multi-process version of the gravity engine.
+# The rows of bodies and particles are split across a pool of worker processes which all read the coordinates,
+# masses and radii from (and write the accelerations into) multiprocessing.shared_memory blocks,
+# so each step only sends the workers a row range and the names of the blocks (no arrays are pickled).
+# The workers are spawned rather than forked, forking a process that already runs threads (numba's, tensorflow's)
+# can leave the children and the interpreter's exit hanging. So the scripts using it need their if __name__ == '__main__' guard.
+#--------------------------------#
+
+import weakref
+from multiprocessing import get_context, cpu_count, shared_memory, TimeoutError
+
+import numpy as np
+
+from .gravity_vectorized import newtonianLawOfGravitation, direct_accelerations
+from .workspace import Workspace
+
+_attached = {} #key -> (name, block) of the shared memory blocks the worker process has opened
+_workspace = Workspace() #the worker process's own scratch buffers, reused by all of its tasks
+
+def _worker_view(layout, key):
+    name, shape, dtype = layout[key]
+    if key not in _attached or _attached[key][0] != name:
+        if key in _attached: #(the engine reallocated the block, let go of the old one)
+            try:
+                _attached.pop(key)[1].close()
+            except BufferError:
+                pass #a view of it is still around, it is closed once that array is garbage collected
+        _attached[key] = (name, shared_memory.SharedMemory(name=name))
+    return np.ndarray(shape, dtype=dtype, buffer=_attached[key][1].buf)
+
+def _worker_rows(task):
+    #Compute the accelerations for rows [start, end) of the bodies or particles and write them into shared memory.
+    kind, layout, start, end, G, memory_cap = task
+    verts_coord = _worker_view(layout, 'verts_coord')
+    verts_mass = _worker_view(layout, 'verts_mass')
+
+    if kind == 'bodies':
+        accel, _ = direct_accelerations(verts_coord[start:end], verts_coord, verts_mass, G, memory_cap=memory_cap,
+                                        workspace=_workspace)
+        _worker_view(layout, 'verts_accel')[start:end] = accel
+    else:
+        accel, uncollided = direct_accelerations(_worker_view(layout, 'parts_coord')[start:end], verts_coord, verts_mass, G,
+                                                 target_radius=_worker_view(layout, 'parts_radius')[start:end],
+                                                 source_radius=_worker_view(layout, 'verts_radius'), memory_cap=memory_cap,
+                                                 workspace=_workspace)
+        _worker_view(layout, 'parts_accel')[start:end] = accel
+        _worker_view(layout, 'parts_uncollided')[start:end] = uncollided
+
+def _free(shm):
+    shm.unlink()
+    try:
+        shm.close()
+    except BufferError:
+        pass #the engine still holds a view of the old block, it is closed once that array is garbage collected
+
+def _shutdown(pools, shared):
+    #Stop the worker processes and free the shared memory blocks. It is the engine's finalizer (run by close(), when the
+    #engine is garbage collected or at exit) so it only gets the engine's pools and blocks, not the engine itself.
+    for pool in pools:
+        pool.terminate()
+    del pools[:]
+    for key in list(shared):
+        _free(shared.pop(key)[0])
+
+class multiprocessGravitation(newtonianLawOfGravitation):
+    #Same engine as newtonianLawOfGravitation but the direct sums are split across worker processes.
+    n_workers = None #number of worker processes (defaults to one per cpu core)
+    serial_rows = 256 #below this many rows the step is done in this process (the pool round trip would cost more)
+    worker_timeout = 120 #seconds to wait for the workers' rows before taking it that one of them died
+
+    _pool = None
+    _shared = None
+    _finalizer = None
+
+    def __load_builder__(self):
+        super(multiprocessGravitation, self).__load_builder__()
+        #keep the engine's own arrays in shared memory so the workers see every in-place update without a copy
+        #(the particles are views of the particle pool's rows instead, they are copied in for each evaluation)
+        self.verts_coord = self._share('verts_coord', self.verts_coord)
+        self.verts_mass = self._share('verts_mass', self.verts_mass)
+        self.verts_radius = self._share('verts_radius', self.verts_radius)
+
+    def _merge_bodies(self):
+        #the merged body arrays are views of the old blocks, they are copied out before those are released for blocks of the new size
+        if not super(multiprocessGravitation, self)._merge_bodies():
+            return False
+        self.verts_coord = self._share('verts_coord', self.verts_coord.copy())
+        self.verts_mass = self._share('verts_mass', self.verts_mass.copy())
+        self.verts_radius = self._share('verts_radius', self.verts_radius.copy())
+        return True
+
+    def _buffer(self, key, shape, dtype=np.float64):
+        #A shared memory array for the key, the block is only reallocated when the shape or dtype changes.
+        if self._shared is None:
+            self._shared = {}
+            self._pools = []
+            self._finalizer = weakref.finalize(self, _shutdown, self._pools, self._shared)
+        block = self._shared.get(key)
+        if block is not None and (block[1].shape != tuple(shape) or block[1].dtype != dtype):
+            self._release(key)
+            block = None
+        if block is None:
+            shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1))
+            block = self._shared[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+        return block[1]
+
+    def _share(self, key, array):
+        #The shared memory array for the key holding the array's values (nothing is copied when it already is that array).
+        buf = self._buffer(key, array.shape, array.dtype)
+        if buf is not array:
+            buf[...] = array
+        return buf
+
+    def _layout(self, keys):
+        return {k: (self._shared[k][0].name, self._shared[k][1].shape, self._shared[k][1].dtype.str) for k in keys}
+
+    def _run(self, kind, n_rows, keys):
+        if self._pool is None:
+            self._n_tasks = self.n_workers or cpu_count()
+            self._pool = get_context('spawn').Pool(self._n_tasks)
+            self._pools.append(self._pool)
+        bounds = np.linspace(0, n_rows, self._n_tasks + 1).astype(int)
+        layout = self._layout(keys)
+        tasks = [(kind, layout, a, b, self.G, self.particle_memory_cap) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+        try:
+            self._pool.map_async(_worker_rows, tasks).get(self.worker_timeout)
+        except TimeoutError:
+            #(a worker that dies takes its rows with it and the pool would wait for them forever)
+            self._pools.remove(self._pool)
+            self._pool.terminate()
+            self._pool = None
+            raise RuntimeError('The worker processes did not finish a step within %g s, one of them may have died' % self.worker_timeout)
+
+    def _body_accelerations(self, coord):
+        n = coord.shape[0]
+        if n < self.serial_rows:
+            return super(multiprocessGravitation, self)._body_accelerations(coord)
+
+        self._share('verts_coord', coord)
+        self._share('verts_mass', self.verts_mass)
+        accel = self._buffer('verts_accel', (n, 3), coord.dtype)
+        self._run('bodies', n, ('verts_coord', 'verts_mass', 'verts_accel'))
+        return accel.copy()
+
+    def _particle_accelerations(self, coord):
+        p = coord.shape[0]
+        if p < self.serial_rows:
+            return super(multiprocessGravitation, self)._particle_accelerations(coord)
+
+        self._share('parts_coord', coord)
+        self._share('parts_radius', self.parts_radius)
+        self._share('verts_coord', self.verts_coord)
+        self._share('verts_mass', self.verts_mass)
+        self._share('verts_radius', self.verts_radius)
+        accel = self._buffer('parts_accel', (p, 3), coord.dtype)
+        uncollided = self._buffer('parts_uncollided', (p,), bool)
+        self._run('particles', p, ('parts_coord', 'parts_radius', 'verts_coord', 'verts_mass', 'verts_radius',
+                                   'parts_accel', 'parts_uncollided'))
+        return accel.copy(), uncollided.copy()
+
+    def _release(self, key):
+        _free(self._shared.pop(key)[0])
+
+    def close(self):
+        #Stop the worker processes and free the shared memory blocks.
+        if self._finalizer is not None:
+            self._finalizer()
+        self._pool = None
+        self._shared = None
@@ -0,0 +1,79 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Particle-mesh gravity for particles that have mass.
+# Mass is deposited onto a 3D grid with cloud-in-cell weighting, Poisson's equation is solved with numpy's FFT
+# (zero padded to twice the size so the cloud is isolated instead of periodic) and the accelerations are
+# interpolated back to the particles with the same weights, so the cost per step is fixed by the grid size.
+#--------------------------------#
+
+import numpy as np
+
+class ParticleMesh():
+    mesh_size = 64 #grid cells along each axis of the cube around the particles
+
+    def __init__(self, mesh_size=None):
+        if mesh_size is not None:
+            self.mesh_size = mesh_size
+        n = self.mesh_size
+
+        #the 1/r green's function for unit cell size on the padded grid (distances wrap around so the fft gives a linear convolution)
+        r = np.minimum(np.arange(2 * n), 2 * n - np.arange(2 * n)).astype(float)
+        space = r[:, None, None] ** 2 + r[None, :, None] ** 2 + r[None, None, :] ** 2
+        space[0, 0, 0] = 1 #the mass in a cell pulls on that cell as if it were one cell away
+        self.green_fft = np.fft.rfftn(1 / np.sqrt(space))
+
+    def _grid(self, coord):
+        #a cube around the points with one spare cell on every side so all eight cic corners are inside the grid
+        lo, hi = coord.min(axis=0), coord.max(axis=0)
+        cell = (hi - lo).max() / (self.mesh_size - 3)
+        if not cell > 0:
+            cell = 1.0
+        return lo - 1.5 * cell, cell
+
+    def _cic(self, coord, lo, cell):
+        #the flat index of the lower corner cell and the eight (offset, weight) pairs for every point
+        u = (coord - lo) / cell - 0.5
+        i0 = np.floor(u).astype(int)
+        f = u - i0
+        n = self.mesh_size
+        base = (i0[:, 0] * n + i0[:, 1]) * n + i0[:, 2]
+        corners = []
+        for dx in (0, 1):
+            for dy in (0, 1):
+                for dz in (0, 1):
+                    w = (f[:, 0] if dx else 1 - f[:, 0]) * (f[:, 1] if dy else 1 - f[:, 1]) * (f[:, 2] if dz else 1 - f[:, 2])
+                    corners.append(((dx * n + dy) * n + dz, w))
+        return base, corners
+
+    def deposit(self, coord, mass, lo, cell):
+        n = self.mesh_size
+        base, corners = self._cic(coord, lo, cell)
+        grid = np.zeros(n ** 3)
+        for offset, w in corners:
+            grid += np.bincount(base + offset, w * mass, n ** 3)
+        return grid.reshape(n, n, n)
+
+    def potential(self, grid, cell, G):
+        #phi = -G * sum(m / r) as a convolution of the mass grid with the green's function
+        n = self.mesh_size
+        padded = np.fft.rfftn(grid, s=(2 * n,) * 3)
+        phi = np.fft.irfftn(padded * self.green_fft, s=(2 * n,) * 3)[:n, :n, :n]
+        return phi * (-G / cell)
+
+    def interpolate(self, field, coord, lo, cell):
+        base, corners = self._cic(coord, lo, cell)
+        flat = field.reshape(-1)
+        out = np.zeros(coord.shape[0])
+        for offset, w in corners:
+            out += flat[base + offset] * w
+        return out
+
+    def accelerations(self, coord, mass, G):
+        #The gforce on every point from the mass of all of the points as seen through the mesh.
+        lo, cell = self._grid(coord)
+        phi = self.potential(self.deposit(coord, mass, lo, cell), cell, G)
+        accel = np.empty_like(coord)
+        for ax, g in enumerate(np.gradient(phi, cell)):
+            accel[:, ax] = -self.interpolate(g, coord, lo, cell)
+        return accel
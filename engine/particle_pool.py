@@ -0,0 +1,87 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Fixed capacity storage for the particles.
+# The rows in use are kept at the front of every array, the engine only steps those (as views of the first live rows).
+# A removed particle's row goes on a free list that new particles fill before the pool takes more rows, and
+# compact() moves the alive rows to the front once enough of them are dead, returning the old row -> new row remap.
+#--------------------------------#
+
+import numpy as np
+
+class ParticlePool():
+    growth = 2 #the capacity is multiplied by this when more rows are needed than there are
+
+    def __init__(self, arrays, capacity=None, alive=None):
+        #arrays: name -> array with one row per particle, alive: which of them are alive (all of them by default)
+        n = len(next(iter(arrays.values())))
+        self.capacity = max(capacity or n, n, 1)
+        self.arrays = {}
+        for name, array in arrays.items():
+            store = np.zeros((self.capacity,) + array.shape[1:], dtype=array.dtype)
+            store[:n] = array
+            self.arrays[name] = store
+
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.alive[:n] = True if alive is None else alive
+        self.live = n #rows at the front in use (alive or on the free list)
+        self.free = np.flatnonzero(~self.alive[:n]).tolist() #dead rows among them, reused last in first out
+
+    def view(self, name):
+        return self.arrays[name][:self.live]
+
+    def dead_fraction(self):
+        return len(self.free) / float(self.live) if self.live else 0.
+
+    def kill(self, index):
+        #Flag the rows (a boolean mask over the live rows or row numbers) dead, rows that already are are skipped.
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+        index = np.unique(index[self.alive[index]])
+        self.alive[index] = False
+        self.free.extend(index.tolist())
+
+    def spawn(self, values):
+        #Take a row for each new particle (free rows first, then new ones at the end of the live rows) and fill them in,
+        #fields missing from values are zeroed. Returns the rows.
+        k = len(values['coord'])
+        reused = min(k, len(self.free))
+        rows = np.array(self.free[len(self.free) - reused:][::-1], dtype=int)
+        del self.free[len(self.free) - reused:]
+
+        extra = k - reused
+        if self.live + extra > self.capacity:
+            self._grow(max(self.live + extra, self.capacity * self.growth))
+        rows = np.append(rows, np.arange(self.live, self.live + extra))
+        self.live += extra
+
+        for name, store in self.arrays.items():
+            store[rows] = values[name] if values.get(name) is not None else 0
+        self.alive[rows] = True
+        return rows
+
+    def compact(self):
+        #Move the alive rows to the front (keeping their order) and drop the dead ones from the live rows.
+        #Returns the remap: for every old live row its new row, -1 for the removed particles.
+        keep = np.flatnonzero(self.alive[:self.live])
+        m = keep.shape[0]
+        remap = np.full(self.live, -1, dtype=int)
+        remap[keep] = np.arange(m)
+        for store in self.arrays.values():
+            store[:m] = store[keep]
+        self.alive[m:self.live] = False
+        self.alive[:m] = True
+        self.live = m
+        self.free = []
+        return remap
+
+    def _grow(self, capacity):
+        for name, store in self.arrays.items():
+            bigger = np.zeros((capacity,) + store.shape[1:], dtype=store.dtype)
+            bigger[:self.capacity] = store
+            self.arrays[name] = bigger
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.capacity] = self.alive
+        self.alive = alive
+        self.capacity = capacity
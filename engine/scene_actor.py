@@ -6,7 +6,7 @@ from OpenGL.GL import *  # @UnusedWildImport # this comment squelches an IDE war
 from OpenGL.GL.shaders import compileShader, compileProgram
 from OpenGL.arrays import vbo
 
-from .gravity_vectorized import newtonianLawOfGravitation
+from .backends import create_gravity
 
 """
 Scene for simple Newton law of gravitation in openvr example
@@ -20,10 +20,16 @@ class MeshActor(object):
     z_offset = 0
 
     initialize = True #will be false after initializing VAO arrays, if set true again the the buffers will reload
-
-    def __init__(self, scene):
-        self.gravity = newtonianLawOfGravitation(scene)
+    vao = None #made once, reloading only uploads new data into its buffers
+    vertexPositions = None #made on the first frame, every frame after uploads into them again
+    vertexColors = None
+    _positions = None #float32 copies of the frame's positions and colors, reused while the counts stay the same
+    _colors = None
+
+    def __init__(self, scene, backend='numpy', integrator=None):
+        self.gravity = create_gravity(scene, backend, integrator)
         self.array_size = self.gravity.builder.get_array_size()
+        self.generation = self.gravity.parts_generation
         self._init_arrays()
 
         "This constructor must only be called with a live OpenGL context"
@@ -43,7 +49,8 @@ class MeshActor(object):
             self.sizes = np.append(self.sizes, self.gravity.parts_radius, axis=0)
 
     def _init_buffers(self):
-        self.vao = glGenVertexArrays(1) #create the VAO
+        if self.vao is None: #(reloads keep the VAO and its buffers, so they do not pile up every time the particles move rows)
+            self.vao = glGenVertexArrays(1) #create the VAO
         glBindVertexArray(self.vao) #start bind with VAO
 
         # Colors data buffer initialization (only touched once unless reinitialized) / This has now been moved to the main loop
@@ -53,7 +60,7 @@ class MeshActor(object):
         #glVertexAttribPointer(1, 4, GL_FLOAT, False, 0, None)
 
         # Sizes data buffer initialization (only touched once unless reinitialized)
-        self.vertexSizes = vbo.VBO((self.sizes * self.size_scale * 5500 / self.gravity.size_scale ).astype(np.float32))
+        self.vertexSizes.set_array((self.sizes * self.size_scale * 5500 / self.gravity.size_scale ).astype(np.float32))
         self.vertexSizes.bind()
         glEnableVertexAttribArray(2)
         glVertexAttribPointer(2, 1, GL_FLOAT, False, 0, None)
@@ -68,6 +75,13 @@ class MeshActor(object):
             self._init_buffers()
 
         self.vertices, self.colors = self.gravity.update()
+        if self.generation != self.gravity.parts_generation: #the particles moved rows (compacted, spawned or reset), reload their sizes
+            self.generation = self.gravity.parts_generation
+            if self.vertices.shape[0] > self.indices.shape[0]:
+                self.indices = np.arange(self.vertices.shape[0], dtype=np.uint32)
+                self.indexPositions.set_array(self.indices) #(uploaded when _init_buffers binds it)
+            self._init_arrays()
+            self._init_buffers()
 
         self.vertices[:,0] += self.y_offset
         self.vertices[:,1] += self.z_offset
@@ -76,13 +90,19 @@ class MeshActor(object):
         glBindVertexArray(self.vao) #start bind with VAO
 
         # Vertices data buffer initialization
-        self.vertexPositions = vbo.VBO(self.vertices.astype(np.float32) * self.size_scale)
+        if self._positions is None or self._positions.shape != self.vertices.shape:
+            self._positions = np.empty(self.vertices.shape, dtype=np.float32)
+        np.multiply(self.vertices, self.size_scale, out=self._positions, casting='same_kind')
+        self.vertexPositions = self._upload(self.vertexPositions, self._positions)
         self.vertexPositions.bind()
         glEnableVertexAttribArray(0)
         glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, None)
 
         # Colors data buffer initialization
-        self.vertexColors = vbo.VBO(self.colors.astype(np.float32))
+        if self._colors is None or self._colors.shape != self.colors.shape:
+            self._colors = np.empty(self.colors.shape, dtype=np.float32)
+        np.copyto(self._colors, self.colors, casting='same_kind')
+        self.vertexColors = self._upload(self.vertexColors, self._colors)
         self.vertexColors.bind()
         glEnableVertexAttribArray(1)
         glVertexAttribPointer(1, 4, GL_FLOAT, False, 0, None)#
@@ -91,17 +111,29 @@ class MeshActor(object):
         glBindVertexArray(0) #stop bind VAO
 
 
+    def _upload(self, buffer, data):
+        #The VBO with data in it, a new one only the first time (set_array uploads into the same buffer on its next bind).
+        if buffer is None:
+            return vbo.VBO(data)
+        buffer.set_array(data)
+        return buffer
+
     def dispose_gl(self):
         glDeleteVertexArrays(1, (self.vao,))
+        self.vao = None
         self.vbo = 0
         self.vertexPositions.delete()
+        self.vertexColors.delete()
+        self.vertexSizes.delete()
         self.indexPositions.delete()
 
 class SceneActor(object):
     mesh = None
 
-    def __init__(self, builder):
+    def __init__(self, builder, backend='numpy', integrator=None):
         self.builder = builder
+        self.backend = backend #name of the physics backend (see backends.py)
+        self.integrator = integrator #name of the integrator (see integrators.py), None for the engine's default
         self.shader = 0
 
     def init_gl(self):
@@ -160,7 +192,7 @@ class SceneActor(object):
             """), GL_FRAGMENT_SHADER)
 
         self.shader = compileProgram(vertex_shader, fragment_shader)
-        self.mesh = MeshActor(self.builder)
+        self.mesh = MeshActor(self.builder, self.backend, self.integrator)
 
     def display_gl(self, modelview, projection):
 
@@ -0,0 +1,36 @@
+#! /usr/bin/python
+
+#--------------------------------#
+# Scratch buffers kept by the engine between steps, so the kernels write their temporaries with out= instead of
+# allocating new arrays every step. A buffer is only allocated again when it needs more rows (or another shape or dtype),
+# asking for fewer rows returns a view of the leading rows of the one there is.
+#--------------------------------#
+
+import numpy as np
+
+class Workspace():
+    def __init__(self):
+        self.buffers = {}
+        self.allocations = 0 #buffers allocated so far (the engine's debug_workspace checks this does not grow)
+
+    def get(self, name, shape, dtype=np.float64):
+        #A buffer of the shape for the name, its contents are whatever the last user left in it.
+        shape = tuple(int(d) for d in shape)
+        dtype = np.dtype(dtype)
+        buf = self.buffers.get(name)
+        if buf is None or buf.dtype != dtype or buf.shape[1:] != shape[1:] or buf.shape[0] < shape[0]:
+            buf = self.buffers[name] = np.empty(shape, dtype=dtype)
+            self.allocations += 1
+        return buf[:shape[0]]
+
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self.buffers.values())
+
+    def clear(self):
+        self.buffers = {}
+
+def scratch(workspace):
+    #The workspace's get, or plain allocation when there is no workspace.
+    if workspace is None:
+        return lambda name, shape, dtype=np.float64: np.empty(shape, dtype=dtype)
+    return workspace.get
@@ -0,0 +1,111 @@
+#!/bin/env python
+
+#--------------------------------#
+# Runs a scene without any window, for batch experiments and machines without a display.
+# e.g. "python run_headless.py 2 --steps 5000 --backend numba --integrator leapfrog --output saturn.npz --snapshot-every 500"
+# Every update() is one frame of the GUIs, the states are written as .npz files in world coordinates (meters).
+#--------------------------------#
+
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from builder.prebuilds import get_scene_list
+from engine.backends import BACKENDS, create_gravity
+
+def find_scene(name):
+    #A scene builder by its number in get_scene_list() or by name (the class name with or without "Scene_", any case).
+    scenes = get_scene_list()
+    if name.isdigit() and 1 <= int(name) <= len(scenes):
+        return scenes[int(name) - 1][1]
+    for label, builder in scenes:
+        if name.lower() in (builder.__name__.lower(), builder.__name__[len('Scene_'):].lower()):
+            return builder
+    raise ValueError("Unknown scene '%s', choose one of:\n%s" % (name, '\n'.join(
+        '%s (%s)' % (label, builder.__name__) for label, builder in scenes)))
+
+def save_state(gravity, path, update):
+    #The bodies and the live particles as they are now.
+    state = {
+        'update': update,
+        'time': gravity.simTotalTime,
+        'verts_coord': gravity.verts_coord.astype(np.float64) + gravity.origin,
+        'verts_vel': gravity.verts_vel.astype(np.float64),
+        'verts_mass': gravity.verts_mass.astype(np.float64),
+        'verts_radius': gravity.verts_radius.astype(np.float64),
+    }
+    if gravity.parts_coord is not None:
+        alive = gravity._parts_pool.alive[:gravity._parts_pool.live] if gravity._parts_pool is not None else slice(None)
+        state['parts_coord'] = gravity.parts_coord[alive].astype(np.float64) + gravity.origin
+        state['parts_vel'] = gravity.parts_vel[alive].astype(np.float64)
+        state['parts_radius'] = gravity.parts_radius[alive].astype(np.float64)
+        state['parts_id'] = gravity.parts_id[alive]
+    np.savez(path, **state)
+
+def snapshot_path(output, update):
+    stem = output[:-len('.npz')] if output.endswith('.npz') else output
+    return '%s_%06d.npz' % (stem, update)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a GravityVR scene without rendering it.')
+    parser.add_argument('scene', help='scene number or name (see get_scene_list() in builder/prebuilds.py)')
+    parser.add_argument('--steps', type=int, default=1000, help='number of updates (frames) to run')
+    parser.add_argument('--backend', default='numpy', help='physics backend: %s or auto' % ', '.join(BACKENDS))
+    parser.add_argument('--integrator', default=None, help='integrator name (see engine/integrators.py), defaults to euler')
+    parser.add_argument('--time-scale', type=float, default=1, help='simulation speed, as the GUIs\' slider')
+    parser.add_argument('--physics-step', type=float, default=None, help='fixed physics step in simulated seconds (substepped every update)')
+    parser.add_argument('--dtype', choices=('float64', 'float32'), default='float64', help='precision of the physics')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for the scenes built at random')
+    parser.add_argument('--merge-bodies', action='store_true', help='merge bodies that touch (see merge_bodies in engine/gravity_vectorized.py)')
+    parser.add_argument('--output', default=None, help='write the final state to this .npz file')
+    parser.add_argument('--snapshot-every', type=int, default=0, help='also write the state every this many updates (next to --output)')
+    args = parser.parse_args(argv)
+    if args.snapshot_every and not args.output:
+        parser.error('--snapshot-every needs --output')
+
+    try:
+        builder = find_scene(args.scene)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.seed is not None:
+        np.random.seed(args.seed)
+
+    gravity = create_gravity(builder, args.backend, args.integrator)
+    if args.dtype == 'float32': #(the precision is set up when the scene loads, so load it again)
+        gravity.dtype = np.float32
+        if args.seed is not None:
+            np.random.seed(args.seed)
+        gravity.__reset_universe__()
+    gravity.time_scale = args.time_scale
+    gravity.physics_step = args.physics_step
+    if args.merge_bodies:
+        gravity.merge_bodies = True
+
+    try:
+        steps = 0
+        saving = 0 #(time spent writing snapshots is left out of the rates)
+        start = time.time()
+        for update in range(1, args.steps + 1):
+            gravity.update()
+            steps += gravity.substeps
+            if args.snapshot_every and update % args.snapshot_every == 0:
+                saved = time.time()
+                save_state(gravity, snapshot_path(args.output, update), update)
+                saving += time.time() - saved
+        elapsed = time.time() - start - saving
+
+        if args.output:
+            save_state(gravity, args.output, args.steps)
+        n_parts = gravity._parts_pool.alive.sum() if gravity._parts_pool is not None else 0
+        print('%s with %s / %s: %d updates (%d physics steps) in %.2f s, %.1f updates/s, %.1f steps/s' % (
+            builder.__name__, type(gravity).__name__, gravity.integrator, args.steps, steps, elapsed,
+            args.steps / elapsed if elapsed else float('inf'), steps / elapsed if elapsed else float('inf')))
+        print('simulated %.1f s, %d bodies and %d particles left' % (gravity.simTotalTime, gravity.verts_coord.shape[0], n_parts))
+    finally:
+        if hasattr(gravity, 'close'):
+            gravity.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,7 @@
 #!/bin/env python
 
+import sys
+
 from engine.GravityVR_App import QtPysideApp
 from builder.prebuilds import get_scene_list
 from engine.gl_renderer import OpenVrGlRenderer
@@ -10,12 +12,15 @@ PySide application for use with "GravityVR" examples demonstrating pyopenvr
 """
 
 if __name__ == "__main__":
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'numpy' #physics backend name (see engine/backends.py) or "auto"
+    integrator = sys.argv[2] if len(sys.argv) > 2 else None #integrator name (see engine/integrators.py), defaults to euler
+
     txt = "Please choose a scene number:\n"
     for v in get_scene_list():
         txt += v[0]+"\n"
     builder = get_scene_list()[int(input(txt))-1][1]
 
-    scene = SceneActor(builder)
+    scene = SceneActor(builder, backend, integrator)
 
     renderer = OpenVrGlRenderer()
     renderer.append(scene)
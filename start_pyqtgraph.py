@@ -7,7 +7,7 @@ from pyqtgraph.Qt import QtCore, QtGui
 import pyqtgraph.opengl as gl
 
 from builder.prebuilds import get_scene_list
-from engine.gravity_vectorized import newtonianLawOfGravitation
+from engine.backends import create_gravity
 
 class ScatterWidget(QtGui.QWidget):
     datelabel = None
@@ -22,9 +22,9 @@ class ScatterWidget(QtGui.QWidget):
         ## (rotation around z-axis 0 points along x-axis)
     }
 
-    def __init__(self, builder):
+    def __init__(self, builder, backend='numpy', integrator=None):
         super(ScatterWidget, self).__init__()
-        self.gravity = newtonianLawOfGravitation(builder)
+        self.gravity = create_gravity(builder, backend, integrator)
         #Build the Qt GUI
         self.array_size = 0 #The currently loaded points (keeps qt/gl from crashing by keeping array size unchanged when verts get removed )
         self.vBox = QtGui.QHBoxLayout(self)
@@ -59,6 +59,7 @@ class ScatterWidget(QtGui.QWidget):
             color = self.gravity.verts_color
         pt_size = (size * 2) / self.gravity.size_scale
         self.array_size = pos.shape[0]
+        self.generation = self.gravity.parts_generation
         self.sp2 = gl.GLScatterPlotItem(pos=pos, size=pt_size, color=color, pxMode=False) #pxMode false so the points in the viewport remain an absolute size
         self.sp2.setGLOptions('translucent')
         self.gl_widget.addItem(self.sp2)
@@ -66,11 +67,20 @@ class ScatterWidget(QtGui.QWidget):
     def update(self):
         out, col = self.gravity.update()
 
+        self.array_size = max(self.array_size, out.shape[0]) #(spawned particles can outgrow the starting points)
         if self.array_size - out.shape[0] > 0:
             out = np.pad(out, ((0,self.array_size - out.shape[0]),(0,0)), mode='constant')
             col = np.pad(col, ((0,self.array_size - col.shape[0]),(0,0)), mode='constant')
 
-        self.sp2.setData(pos=out, color=col)
+        if self.generation != self.gravity.parts_generation: #the particles moved rows (compacted, spawned or reset) so their sizes move with them
+            self.generation = self.gravity.parts_generation
+            size = self.gravity.verts_radius
+            if self.gravity.parts_coord is not None:
+                size = np.append(size, self.gravity.parts_radius, axis=0)
+            size = np.pad(size, (0, self.array_size - size.shape[0]), mode='constant')
+            self.sp2.setData(pos=out, color=col, size=(size * 2) / self.gravity.size_scale)
+        else:
+            self.sp2.setData(pos=out, color=col)
         epoch = self.gravity.simStartTime + self.gravity.simTotalTime
 
         self.runningtime.setText(str(timedelta(seconds=int(self.gravity.simTotalTime))))
@@ -88,9 +98,9 @@ class ScatterWidget(QtGui.QWidget):
         self.gravity.__reset_universe__()
 
 class MainApp(QtGui.QWidget):
-    def __init__(self, builder):
+    def __init__(self, builder, backend='numpy', integrator=None):
         super(MainApp, self).__init__()
-        self.scatter_widget = ScatterWidget(builder)
+        self.scatter_widget = ScatterWidget(builder, backend, integrator)
         self.initUI()
 
     def initUI(self):
@@ -150,6 +160,9 @@ class MainApp(QtGui.QWidget):
 
 
 if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'numpy' #physics backend name (see engine/backends.py) or "auto"
+    integrator = sys.argv[2] if len(sys.argv) > 2 else None #integrator name (see engine/integrators.py), defaults to euler
+
     txt = "Please choose a scene number:\n"
     for v in get_scene_list():
         txt += v[0]+"\n"
@@ -157,6 +170,6 @@ if __name__ == '__main__':
 
     app = QtGui.QApplication([])
 
-    ex = MainApp(builder)
+    ex = MainApp(builder, backend, integrator)
     ex.show()
     sys.exit(app.exec_())
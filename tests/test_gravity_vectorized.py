@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from engine.backends import create_gravity
+from builder.prebuilds import Scene_ParticleCloud
+
+class Scene_SmallCloud(Scene_ParticleCloud):
+    n_particles = 500
+
+def _momentum(gravity):
+    return np.dot(gravity.verts_mass, gravity.verts_vel) + np.dot(gravity.parts_mass, gravity.parts_vel)
+
+@pytest.mark.parametrize('integrator', ['euler', 'leapfrog', 'yoshida4'])
+@pytest.mark.parametrize('solver', ['direct', 'particle_mesh'])
+def test_particles_with_mass_keep_the_momentum(integrator, solver):
+    #the cloud pulls on the body as hard as the body pulls on the cloud, so their total momentum does not change
+    np.random.seed(0)
+    gravity = create_gravity(Scene_SmallCloud, 'numpy', integrator)
+    gravity.particle_solver = solver
+    gravity.time_scale = 600 / 0.01
+    start = _momentum(gravity)
+    scale = np.dot(gravity.parts_mass, np.sqrt(np.einsum('ij,ij->i', gravity.parts_vel, gravity.parts_vel)))
+    for _ in range(10):
+        gravity.update()
+    assert np.linalg.norm(gravity.verts_vel) > 0 #(the body was pulled at all)
+    assert np.linalg.norm(_momentum(gravity) - start) < 1e-12 * scale
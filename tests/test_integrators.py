@@ -0,0 +1,15 @@
+import numpy as np
+
+from engine.backends import create_gravity
+from builder.prebuilds import Scene_SolarSystem
+
+def test_hermite_keeps_the_particles_on_a_coarse_step():
+    #Saturn's ring needs much shorter steps than the planets, the hermite steps must shrink to them rather than lose the ring
+    gravity = create_gravity(Scene_SolarSystem, 'numpy', 'hermite')
+    gravity.time_scale = 3600 / 0.01 #(an hour per frame)
+    n = gravity.parts_coord.shape[0]
+    for _ in range(10):
+        gravity.update()
+        assert gravity.collision_events == []
+    assert gravity._parts_pool.alive[:gravity._parts_pool.live].sum() == n
+    assert np.isfinite(gravity.parts_coord).all()